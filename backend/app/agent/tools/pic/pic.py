@@ -2,10 +2,13 @@ import numpy as np
 import cupy as cp
 import matplotlib.pyplot as plt
 from tqdm import tqdm
-from scipy.sparse import spdiags, csc_matrix
-from scipy.sparse.linalg import spsolve
 import os
 
+try:
+    from .pic_cpu import charge, poisson_equation_preparation
+except ImportError:  # run as a script: python pic.py
+    from pic_cpu import charge, poisson_equation_preparation
+
 # Set print options for numpy
 np.set_printoptions(threshold=np.inf)
 
@@ -18,42 +21,25 @@ def maxwell_boltzman_dist_1D(v, v_0, v_th):
     n_0 = 1.0
     return ((n_0 / (np.sqrt(2 * np.pi) * v_th)) * np.exp(-((v - v_0) ** 2) / (2 * v_th ** 2)))
 
-def maxwell_boltzman_dist_1D_cupy(v, v_0, v_th):
-    """CuPy version for GPU calculations."""
-    n_0 = 1.0
-    return ((n_0 / (cp.sqrt(2 * cp.pi) * v_th)) * cp.exp(-((v - v_0) ** 2) / (2 * v_th ** 2)))
-
 def acceptance_rejection_cupy(v_min, v_max, v_0, v_th, N):
-    """Vectorized acceptance-rejection method on the GPU."""
-    num_candidates = int(N * 3)
-    accepted_speeds = cp.empty(0, dtype=cp.float64)
-    
-    while accepted_speeds.size < N:
-        r_1 = cp.random.rand(num_candidates)
-        v_candidates = v_min + r_1 * (v_max - v_min)
-        f_max = maxwell_boltzman_dist_1D_cupy(v_0, v_0, v_th)
-        r_2 = cp.random.rand(num_candidates)
-        u_candidates = r_2 * f_max
-        f_values = maxwell_boltzman_dist_1D_cupy(v_candidates, v_0, v_th)
-        mask = u_candidates < f_values
-        newly_accepted = v_candidates[mask]
-        accepted_speeds = cp.concatenate((accepted_speeds, newly_accepted))
-
-    return cp.asnumpy(accepted_speeds[:N])
+    """Samples N Maxwellian speeds directly on the GPU, clipped to [v_min, v_max]."""
+    v = cp.random.normal(v_0, v_th, N, dtype=cp.float32)
+    return cp.clip(v, v_min, v_max)
 
 def initial_loading(N, v_0, v_th, v_min, v_max, amplitude, mode, L):
-    """Initializes particle positions and velocities."""
-    position = np.linspace(0, L, N, dtype=np.float64)
+    """Initializes particle positions and velocities as float32 CuPy arrays."""
+    position = cp.linspace(0, L, N, dtype=cp.float64)
     velocity = acceptance_rejection_cupy(v_min, v_max, v_0, v_th, N)
     if amplitude != 0:
-        position = position + amplitude * np.cos(2 * np.pi * mode * position / L)
-    return position, velocity
+        position = position + amplitude * cp.cos(2 * np.pi * mode * position / L)
+    return position.astype(cp.float32), velocity
 
 # --------------------------------------------------------------------------
 # PLOTTING & SAVING FUNCTIONS
 # --------------------------------------------------------------------------
 
 def save_histogram_as_pdf(vp1, vp2, v0_1, v0_2, v_th, v_min, v_max, filename):
+    vp1, vp2 = cp.asnumpy(vp1), cp.asnumpy(vp2)
     fig, ax = plt.subplots()
     ax.hist(vp1, bins=30, ec="black", fc="blue", density=True, alpha=0.5, lw=1)
     x_1 = np.linspace(vp1.min(), vp1.max(), 1000)
@@ -97,61 +83,262 @@ def save_subplot_as_pdf(ax, filename, legend=False):
 # CORE PIC FUNCTIONS (Using CuPy RawKernels)
 # --------------------------------------------------------------------------
 
-deposit_charge_kernel = cp.RawKernel(r'''
+# Shared by the atomic deposition kernels. Particles are sorted by cell every few steps and
+# drift slowly in between, so neighbouring lanes mostly hit the same grid point: the lanes of
+# a warp first sum their contributions per run of equal cells with shuffles, and only the
+# first lane of each run issues the atomicAdd. Must be called by all 32 lanes of the warp;
+# lanes without a particle pass cell = -1.
+_WARP_DEPOSIT_SRC = r'''
+__device__ __forceinline__ void warp_deposit(double* rho_grid, int cell, double val) {
+    const unsigned FULL = 0xffffffffu;
+    unsigned lane = threadIdx.x & 31;
+    int prev_cell = __shfl_up_sync(FULL, cell, 1);
+    bool head = (lane == 0) || (cell != prev_cell);
+    unsigned heads = __ballot_sync(FULL, head);
+    // Last lane of this run: one before the next run head, or 31
+    unsigned later = heads & ~((2u << lane) - 1u);
+    int seg_end = later ? __ffs(later) - 2 : 31;
+    for (int offset = 1; offset < 32; offset <<= 1) {
+        double other = __shfl_down_sync(FULL, val, offset);
+        if (lane + offset <= seg_end) { val += other; }
+    }
+    if (head && cell >= 0 && val != 0.0) {
+        atomicAdd(&rho_grid[cell], val);
+    }
+}
+'''
+
+deposit_charge_kernel = cp.RawKernel(_WARP_DEPOSIT_SRC + r'''
 extern "C" __global__
-void deposit_charge_kernel(const double* positions, int N, double charge_per_particle, double dx, int Ng, double* rho_grid) {
-    int idx = blockIdx.x * blockDim.x + threadIdx.x;
-    if (idx < N) {
-        double pos = positions[idx];
-        int grid_idx = round(pos / dx);
-        grid_idx = (grid_idx % Ng + Ng) % Ng;
-        atomicAdd(&rho_grid[grid_idx], charge_per_particle / dx);
+void deposit_charge_kernel(const float* positions, int N, const int* species_start, int n_species, const double* Q_s, double inv_dx, int Ng, double* rho_grid) {
+    // Grid-stride loop; the bound is block-uniform so whole warps iterate together for the shuffles
+    for (int base = blockIdx.x * blockDim.x; base < N; base += blockDim.x * gridDim.x) {
+        int idx = base + threadIdx.x;
+        int i0 = -1, i1 = -1;
+        double d0 = 0.0, d1 = 0.0;
+        if (idx < N) {
+            // Species are stored contiguously, so the species follows from the particle index
+            int s = 0;
+            while (s + 1 < n_species && idx >= species_start[s + 1]) { s++; }
+            // Cloud-in-cell weights for the two neighbouring grid points
+            double xn = positions[idx] * inv_dx;
+            int i = (int)floor(xn);
+            double w1 = xn - i;
+            double w0 = 1.0 - w1;
+            i0 = (i % Ng + Ng) % Ng;
+            i1 = (i0 + 1) % Ng;
+            double q = Q_s[s] * inv_dx;
+            d0 = q * w0;
+            d1 = q * w1;
+        }
+        warp_deposit(rho_grid, i0, d0);
+        warp_deposit(rho_grid, i1, d1);
     }
 }
 ''', 'deposit_charge_kernel')
 
-push_particles_kernel = cp.RawKernel(r'''
+push_and_deposit_kernel = cp.RawKernel(_WARP_DEPOSIT_SRC + r'''
 extern "C" __global__
-void push_particles_kernel(double* xp, double* vp, int N, const double* Eg, double re, double dt, double dx, int Ng, double L) {
-    int idx = blockIdx.x * blockDim.x + threadIdx.x;
-    if (idx < N) {
-        double pos = xp[idx];
-        int grid_idx = round(pos / dx);
-        grid_idx = (grid_idx % Ng + Ng) % Ng;
-        double E_particle = Eg[grid_idx];
-        vp[idx] += re * E_particle * dt;
-        double new_pos = xp[idx] + vp[idx] * dt;
-        new_pos = fmod(new_pos, L);
-        if (new_pos < 0) { new_pos += L; }
-        xp[idx] = new_pos;
+void push_and_deposit_kernel(float* xp, float* vp, int N, const int* species_start, int n_species, const double* Q_s, const double* re_s, const double* kinetic_weight_s, const float* Eg, double dt, double inv_dx, int Ng, double L, double* rho_grid, int deposit, double* E_kin) {
+    double ek = 0.0;
+    // Grid-stride loop; the bound is block-uniform so whole warps iterate together for the shuffles
+    for (int base = blockIdx.x * blockDim.x; base < N; base += blockDim.x * gridDim.x) {
+        int idx = base + threadIdx.x;
+        int c0 = -1, c1 = -1;
+        double d0 = 0.0, d1 = 0.0;
+        if (idx < N) {
+            int s = 0;
+            while (s + 1 < n_species && idx >= species_start[s + 1]) { s++; }
+            double pos = xp[idx];
+            double xn = pos * inv_dx;
+            int i = (int)floor(xn);
+            double w1 = xn - i;
+            double w0 = 1.0 - w1;
+            int i0 = (i % Ng + Ng) % Ng;
+            int i1 = (i0 + 1) % Ng;
+            double E_particle = Eg[i0] * w0 + Eg[i1] * w1;
+            double v = vp[idx] + re_s[s] * E_particle * dt;
+            pos = fmod(pos + v * dt, L);
+            if (pos < 0) { pos += L; }
+            xp[idx] = (float)pos;
+            vp[idx] = (float)v;
+            ek += kinetic_weight_s[s] * v * v;
+            if (deposit) {
+                // Deposit the charge at the new position while it is still in registers
+                xn = pos * inv_dx;
+                i = (int)floor(xn);
+                w1 = xn - i;
+                w0 = 1.0 - w1;
+                c0 = (i % Ng + Ng) % Ng;
+                c1 = (c0 + 1) % Ng;
+                double q = Q_s[s] * inv_dx;
+                d0 = q * w0;
+                d1 = q * w1;
+            }
+        }
+        if (deposit) {
+            warp_deposit(rho_grid, c0, d0);
+            warp_deposit(rho_grid, c1, d1);
+        }
+    }
+    // Reduce the kinetic energy within the warp so only one atomic per warp reaches E_kin.
+    // A null E_kin skips the diagnostic; the branch is uniform, so the shuffles stay full-warp.
+    if (E_kin != NULL) {
+        for (int offset = 16; offset > 0; offset >>= 1) {
+            ek += __shfl_down_sync(0xffffffff, ek, offset);
+        }
+        if ((threadIdx.x & 31) == 0) {
+            atomicAdd(E_kin, ek);
+        }
     }
 }
-''', 'push_particles_kernel')
-
-
-def charge(re_1, re_2, N_ions, N1, N2, L, wp_e):
-    """Calculates particle charges and background density."""
-    Q_1 = (wp_e**2 * L) / (N1 * re_1)
-    if re_2 > 0: Q_2 = -Q_1 * (N1 / N2)
-    elif re_2 < 0: Q_2 = Q_1 * (N1 / N2)
-    else: Q_2 = 0
-    rho_ions = (-Q_1 / L) * N_ions
-    return Q_1, Q_2, rho_ions
-
-def poisson_equation_preparation(Ng):
-    """Prepares the sparse matrix for the CPU Poisson solver."""
-    un = np.ones(Ng - 1)
-    Ax = spdiags([un, -2 * un, un], [-1, 0, 1], Ng - 1, Ng - 1)
-    return csc_matrix(Ax)
-
-def solve_field_cpu(charge_density_cpu, Ng, dx, Ax):
-    """Solves Poisson's equation on the CPU."""
-    charge_density_cpu = charge_density_cpu[:Ng-1]
-    Phi = spsolve(Ax, -charge_density_cpu * dx**2)
-    Phi = np.append(Phi, 0)
-    Eg = (np.roll(Phi, 1) - np.roll(Phi, -1)) / (2 * dx)
+''', 'push_and_deposit_kernel')
+
+deposit_sorted_kernel = cp.RawKernel(r'''
+extern "C" __global__
+void deposit_sorted_kernel(const float* positions, const int* cell_start, int n_species, const double* Q_s, double inv_dx, int Ng, double* rho_grid) {
+    // One block per grid point: sums the CIC weights of the particles in cell b (w0)
+    // and in cell b-1 (w1) from the sorted slices of every species, so no atomics are needed.
+    // The segment of species s in cell c is [cell_start[s*Ng + c], cell_start[s*Ng + c + 1]).
+    extern __shared__ double partial[];
+    int b = blockIdx.x;
+    int prev = (b + Ng - 1) % Ng;
+    double sum = 0.0;
+    for (int s = 0; s < n_species; s++) {
+        const int* start = cell_start + s * Ng;
+        double weight = 0.0;
+        for (int k = start[b] + threadIdx.x; k < start[b + 1]; k += blockDim.x) {
+            double xn = positions[k] * inv_dx;
+            weight += 1.0 - (xn - floor(xn));
+        }
+        for (int k = start[prev] + threadIdx.x; k < start[prev + 1]; k += blockDim.x) {
+            double xn = positions[k] * inv_dx;
+            weight += xn - floor(xn);
+        }
+        sum += Q_s[s] * weight;
+    }
+    partial[threadIdx.x] = sum;
+    __syncthreads();
+    for (int s = blockDim.x / 2; s > 0; s >>= 1) {
+        if (threadIdx.x < s) { partial[threadIdx.x] += partial[threadIdx.x + s]; }
+        __syncthreads();
+    }
+    if (threadIdx.x == 0) {
+        rho_grid[b] += inv_dx * partial[0];
+    }
+}
+''', 'deposit_sorted_kernel')
+
+field_derivative_kernel = cp.ElementwiseKernel(
+    'raw float64 Phi, float64 inv_2dx, int32 Ng', 'float32 Eg',
+    'int im = (i - 1 + Ng) % Ng; int ip = (i + 1) % Ng; Eg = (Phi[im] - Phi[ip]) * inv_2dx;',
+    'field_derivative_kernel')
+
+# Sum of squares in one pass without materialising x*x; accumulates in float64 for float32 input
+sum_sq = cp.ReductionKernel(
+    'T x', 'float64 y',
+    '(double)x * (double)x', 'a + b', 'y = a', '0',
+    'sum_sq')
+
+
+def kernel_block_sizes():
+    """Returns (DEPOSIT_TPB, PUSH_TPB), the block sizes of the deposit and push kernels.
+
+    Deposition uses one warp per block, so a block covers a contiguous run of sorted particles;
+    push prefers large blocks. Both can be overridden with PIC_DEPOSIT_TPB / PIC_PUSH_TPB.
+    The kernels reduce with full-warp shuffles and deposit_sorted_kernel with a shared-memory
+    tree, so PUSH_TPB must be a multiple of 32 and DEPOSIT_TPB a power of two, both in [32, 1024].
+    Raises ValueError for any other value.
+    """
+    deposit_tpb = int(os.environ.get('PIC_DEPOSIT_TPB', 32))
+    push_tpb = int(os.environ.get('PIC_PUSH_TPB', 256))
+    if not 32 <= deposit_tpb <= 1024 or deposit_tpb & (deposit_tpb - 1):
+        raise ValueError(f"PIC_DEPOSIT_TPB must be a power of two between 32 and 1024, got {deposit_tpb}")
+    if not 32 <= push_tpb <= 1024 or push_tpb % 32:
+        raise ValueError(f"PIC_PUSH_TPB must be a multiple of 32 between 32 and 1024, got {push_tpb}")
+    return deposit_tpb, push_tpb
+
+_sm_count = None
+
+def grid_blocks(N, threads_per_block):
+    """Number of blocks for the grid-stride kernels: enough to cover N, capped at 8 per SM."""
+    global _sm_count
+    if _sm_count is None:
+        _sm_count = cp.cuda.Device().attributes['MultiProcessorCount']
+    return min((N + threads_per_block - 1) // threads_per_block, 8 * _sm_count)
+
+def merge_species(xps, vps, charges, res):
+    """Packs all species into one contiguous particle buffer with per-species lookup tables.
+
+    Returns (xp, vp, species_start, species_id, Q_s, re_s, kinetic_weight_s). Species i
+    occupies xp[species_start[i]:species_start[i+1]].
+    """
+    counts = [x.size for x in xps]
+    xp = cp.concatenate(xps)
+    vp = cp.concatenate(vps)
+    species_start = cp.asarray(np.concatenate(([0], np.cumsum(counts))), dtype=cp.int32)
+    species_id = cp.repeat(cp.arange(len(counts), dtype=cp.int32), counts)
+    Q_s = cp.asarray(charges, dtype=cp.float64)
+    re_s = cp.asarray(res, dtype=cp.float64)
+    kinetic_weight_s = 0.5 * cp.abs(Q_s / re_s)
+    return xp, vp, species_start, species_id, Q_s, re_s, kinetic_weight_s
+
+def sort_particles_by_cell(xp, vp, species_id, inv_dx, Ng, n_species):
+    """Sorts particles by (species, cell) and returns the sorted arrays with per-cell start offsets.
+
+    Sorting on species first keeps every species contiguous, so species_id stays valid.
+    """
+    # Cell index computed in double precision, exactly as the kernels do
+    key = cp.floor(xp.astype(cp.float64) * inv_dx).astype(cp.int32) % Ng + species_id * Ng
+    order = cp.argsort(key)
+    cell_start = cp.searchsorted(key[order], cp.arange(n_species * Ng + 1, dtype=cp.int32)).astype(cp.int32)
+    return xp[order], vp[order], cell_start
+
+def deposit_sorted(xp, vp, species_id, Q_s, inv_dx, Ng, rho_grid, threads_per_block):
+    """Sorts particles by cell and deposits their charge with a segmented reduction."""
+    n_species = Q_s.size
+    xp, vp, cell_start = sort_particles_by_cell(xp, vp, species_id, inv_dx, Ng, n_species)
+    deposit_sorted_kernel((Ng,), (threads_per_block,),
+                          (xp, cell_start, n_species, Q_s, inv_dx, Ng, rho_grid),
+                          shared_mem=threads_per_block * 8)
+    return xp, vp
+
+def poisson_equation_preparation_gpu(Ng, dx):
+    """Device copy of the inverse Laplacian symbol for the GPU Poisson solver."""
+    return cp.asarray(poisson_equation_preparation(Ng, dx))
+
+def solve_field_gpu(charge_density, Ng, dx, inv_k2, Eg=None):
+    """Solves Poisson's equation on the GPU with periodic boundaries via cuFFT.
+
+    Phi is kept in float64; Eg is returned as float32 for interpolation onto the particles.
+    """
+    Phi = cp.fft.irfft(cp.fft.rfft(charge_density) * inv_k2, n=Ng)
+    if Eg is None:
+        Eg = cp.empty(Ng, dtype=cp.float32)
+    field_derivative_kernel(Phi, 0.5 / dx, Ng, Eg)
     return Phi, Eg
 
+def pinned_empty(shape, dtype=np.float64):
+    """Allocates a NumPy array backed by page-locked host memory for asynchronous copies."""
+    count = int(np.prod(shape))
+    mem = cp.cuda.alloc_pinned_memory(count * np.dtype(dtype).itemsize)
+    return np.frombuffer(mem, dtype, count).reshape(shape)
+
+def snapshot_to_host_async(arrays, host_buffers, copy_stream):
+    """Copies device arrays into pinned host buffers on copy_stream without stalling the compute stream.
+
+    The arrays are first staged on the device so later steps may overwrite them. Returns the
+    completion event and the staging arrays, which must be kept alive until the event is done.
+    """
+    staging = [a.copy() for a in arrays]
+    ready = cp.cuda.Event()
+    ready.record()
+    copy_stream.wait_event(ready)
+    for src, dst in zip(staging, host_buffers):
+        cp.cuda.runtime.memcpyAsync(dst.ctypes.data, src.data.ptr, src.nbytes,
+                                    cp.cuda.runtime.memcpyDeviceToHost, copy_stream.ptr)
+    return copy_stream.record(), staging
+
 # --------------------------------------------------------------------------
 # MAIN SIMULATION
 # --------------------------------------------------------------------------
@@ -162,6 +349,7 @@ def main():
     wp_e = 1.0
     Ng = 256
     dx = L / Ng
+    inv_dx = 1.0 / dx
     Nt = 16000
     dt = 0.1
     v_th = 1.0
@@ -183,110 +371,144 @@ def main():
     os.makedirs(output_dir, exist_ok=True)
     
     print("0. Initializing particles...")
-    xp1_cpu, vp1_cpu = initial_loading(N1, v0_1, v_th, v_min, v_max, 0, 0, L)
-    xp2_cpu, vp2_cpu = initial_loading(N2, v0_2, v_th, v_min, v_max, 0, 0, L)
-
-    print("1. Transferring data to GPU...")
-    xp1, vp1 = cp.asarray(xp1_cpu), cp.asarray(vp1_cpu)
-    xp2, vp2 = cp.asarray(xp2_cpu), cp.asarray(vp2_cpu)
+    # 粒子直接在GPU上生成，无需再从主机传输
+    xp1, vp1 = initial_loading(N1, v0_1, v_th, v_min, v_max, 0, 0, L)
+    xp2, vp2 = initial_loading(N2, v0_2, v_th, v_min, v_max, 0, 0, L)
 
+    print("1. Preparing GPU buffers...")
     Q1, Q2, rho_ions = charge(re_1, re_2, N_ions, N1, N2, L, wp_e)
-    Ax = poisson_equation_preparation(Ng)
+    # 两种粒子合并到同一缓冲区，每步只需启动一次 kernel；xp[:N1] 为束流1，xp[N1:] 为束流2
+    xp, vp, species_start, species_id, Q_s, re_s, kinetic_weight_s = merge_species(
+        [xp1, xp2], [vp1, vp2], [Q1, Q2], [re_1, re_2])
+    N = N1 + N2
+    n_species = 2
+    inv_k2 = poisson_equation_preparation_gpu(Ng, dx)
     
+    # 粒子状态 (xp, vp, Eg) 使用 float32，电荷密度、电势与能量以 float64 累加
+    # 能量诊断全程留在GPU上：动能由 push_and_deposit_kernel 直接累加，
+    # E_pot_gpu 存放 sum(Eg^2)，读出时再乘以 0.5*dx
     E_kin_gpu = cp.zeros(Nt, dtype=cp.float64)
     E_pot_gpu = cp.zeros(Nt, dtype=cp.float64)
     time = np.arange(0, Nt * dt, dt)
     
-    threads_per_block = 256
-    blocks_per_grid_N1 = (N1 + threads_per_block - 1) // threads_per_block
-    blocks_per_grid_N2 = (N2 + threads_per_block - 1) // threads_per_block
+    DEPOSIT_TPB, PUSH_TPB = kernel_block_sizes()
+    sort_interval = 20 # 每 20 步按网格排序一次粒子，并用无原子操作的分段归约沉积电荷
+    deposit_blocks = grid_blocks(N, DEPOSIT_TPB)
+    push_blocks = grid_blocks(N, PUSH_TPB)
 
     # --- 初始化绘图窗口 ---
     fig, axs = plt.subplots(2, 3, figsize=(15, 9))
     plt.subplots_adjust(hspace=0.4, wspace=0.4)
 
+    # --- 绘图快照：经独立拷贝流异步传回固定页内存，与后续步的计算重叠 ---
+    copy_stream = cp.cuda.Stream(non_blocking=True)
+    snapshot_buffers = [pinned_empty(N1, np.float32), pinned_empty(N1, np.float32),
+                        pinned_empty(N2, np.float32), pinned_empty(N2, np.float32),
+                        pinned_empty(Ng), pinned_empty(Ng, np.float32), pinned_empty(Ng),
+                        pinned_empty(Nt), pinned_empty(Nt)]
+    pending = None
+
+    def plot_snapshot(it):
+        # 复制一份，避免下一个快照覆盖仍被图像引用的数据
+        xp1_p, vp1_p, xp2_p, vp2_p, Phi_p, Eg_p, rhot_p, E_kin_p, E_pot_p = [b.copy() for b in snapshot_buffers]
+        E_pot_p *= 0.5 * dx
+
+        # --- 绘图窗口 ---
+        fig.suptitle(f'Simulation Plots - Iteration {it}', fontsize=16)
+
+        # 速度分布图
+        axs[0, 0].cla()
+        axs[0, 0].hist(vp1_p, bins=30, ec="black", fc="blue", density=True, alpha=0.5, lw=1)
+        axs[0, 0].hist(vp2_p, bins=30, ec="black", fc="red", density=True, alpha=0.5, lw=1)
+        axs[0, 0].set_title('Velocity Distribution')
+        axs[0, 0].set_xlabel('$v$/$v_{th}$')
+        axs[0, 0].axis([v_min, v_max, 0, 0.4])
+
+        # 相空间图
+        axs[0, 1].cla()
+        axs[0, 1].scatter(xp1_p, vp1_p, s=0.1, color='blue', alpha=0.5)
+        axs[0, 1].scatter(xp2_p, vp2_p, s=0.1, color='red', alpha=0.5)
+        axs[0, 1].axis([0, L, -15, 15])
+        axs[0, 1].set_title('Phase Space')
+        axs[0, 1].set_xlabel('$x$/$\lambda_{D}$')
+
+        # 电势图
+        axs[1, 1].cla()
+        axs[1, 1].plot(Phi_p, color='orangered', linewidth=1)
+        axs[1, 1].set_title('Electric Potential')
+        axs[1, 1].set_xlabel('$x$/$\lambda_{D}$')
+
+        # 能量演化图
+        axs[0, 2].cla()
+        axs[0, 2].plot(time[:it+1], E_kin_p[:it+1], color='yellowgreen', label='Kinetic', linewidth=1)
+        axs[0, 2].plot(time[:it+1], E_pot_p[:it+1], color='orange', label='Potential', linewidth=1)
+        axs[0, 2].set_xlim([0, Nt * dt])
+        axs[0, 2].legend()
+        axs[0, 2].set_title('Energy Evolution')
+        axs[0, 2].set_xlabel('$\omega_{p,e}t$')
+
+        # 电场图
+        axs[1, 0].cla()
+        axs[1, 0].plot(Eg_p, color='royalblue', linewidth=1)
+        axs[1, 0].set_title('Electric Field')
+        axs[1, 0].set_xlabel('$x$/$\lambda_{D}$')
+
+        # 电荷密度图
+        axs[1, 2].cla()
+        axs[1, 2].plot(rhot_p, color='tomato', linewidth=1)
+        axs[1, 2].set_title('Charge Density')
+        axs[1, 2].set_xlabel('$x$/$\lambda_{D}$')
+        
+        plt.pause(0.001)
+
+        # --- 保存特定帧的图像 ---
+        if it in save_iterations:
+            print(f"\nSaving plots for iteration {it}...")
+            save_histogram_as_pdf(vp1_p, vp2_p, v0_1, v0_2, v_th, v_min, v_max, os.path.join(output_dir, f'dist_{it}.pdf'))
+            save_scatter_as_pdf(xp1_p, vp1_p, xp2_p, vp2_p, L, os.path.join(output_dir, f'phase_space_{it}.pdf'))
+            save_subplot_as_pdf(axs[1, 1], os.path.join(output_dir, f'potential_{it}.pdf'))
+            save_subplot_as_pdf(axs[0, 2], os.path.join(output_dir, f'energy_{it}.pdf'), True)
+            save_subplot_as_pdf(axs[1, 0], os.path.join(output_dir, f'efield_{it}.pdf'))
+            save_subplot_as_pdf(axs[1, 2], os.path.join(output_dir, f'rho_{it}.pdf'))
+
+    # 初始电荷沉积，之后每一步的沉积由 push_and_deposit_kernel 完成
+    # 两块预分配的电荷密度缓冲区交替使用：rhot 保存本步求解用的密度，rho_grid 接收下一步的沉积
+    rho_grid = cp.zeros(Ng, dtype=cp.float64)
+    rhot = cp.zeros(Ng, dtype=cp.float64)
+    Eg = cp.empty(Ng, dtype=cp.float32)
+    deposit_charge_kernel((deposit_blocks,), (DEPOSIT_TPB,), (xp, N, species_start, n_species, Q_s, inv_dx, Ng, rho_grid))
+
     print("2. Starting main simulation loop...")
     for it in tqdm(range(Nt)):
-        rho_grid = cp.zeros(Ng, dtype=cp.float64)
-        deposit_charge_kernel((blocks_per_grid_N1,), (threads_per_block,), (xp1, N1, Q1, dx, Ng, rho_grid))
-        deposit_charge_kernel((blocks_per_grid_N2,), (threads_per_block,), (xp2, N2, Q2, dx, Ng, rho_grid))
         rho_grid += rho_ions
         
-        rho_cpu = cp.asnumpy(rho_grid)
-        Phi_cpu, Eg_cpu = solve_field_cpu(rho_cpu, Ng, dx, Ax)
-        Eg = cp.asarray(Eg_cpu)
-
-        push_particles_kernel((blocks_per_grid_N1,), (threads_per_block,), (xp1, vp1, N1, Eg, re_1, dt, dx, Ng, L))
-        push_particles_kernel((blocks_per_grid_N2,), (threads_per_block,), (xp2, vp2, N2, Eg, re_2, dt, dx, Ng, L))
+        Phi, Eg = solve_field_gpu(rho_grid, Ng, dx, inv_k2, Eg)
+
+        rhot, rho_grid = rho_grid, rhot
+        cp.cuda.runtime.memsetAsync(rho_grid.data.ptr, 0, rho_grid.nbytes, cp.cuda.get_current_stream().ptr)
+        sort_step = it % sort_interval == 0
+        push_and_deposit_kernel((push_blocks,), (PUSH_TPB,), (xp, vp, N, species_start, n_species, Q_s, re_s, kinetic_weight_s, Eg, dt, inv_dx, Ng, L, rho_grid, 0 if sort_step else 1, E_kin_gpu[it:it+1]))
+        if sort_step:
+            xp, vp = deposit_sorted(xp, vp, species_id, Q_s, inv_dx, Ng, rho_grid, DEPOSIT_TPB)
         
-        E_kin_gpu[it] = 0.5 * cp.abs(Q1 / re_1) * cp.sum(vp1**2) + 0.5 * cp.abs(Q2 / re_2) * cp.sum(vp2**2)
-        E_pot_gpu[it] = 0.5 * cp.sum(Eg**2) * dx
+        sum_sq(Eg, out=E_pot_gpu[it])
+
+        # 上一个快照拷贝完成后再绘图，不阻塞GPU计算
+        if pending is not None and pending[1].done:
+            plot_snapshot(pending[0])
+            pending = None
 
         if it % plot_interval == 0 or it in save_iterations or it == Nt - 1:
-            # --- 从 GPU 传回 CPU ---
-            xp1_p, vp1_p = cp.asnumpy(xp1), cp.asnumpy(vp1)
-            xp2_p, vp2_p = cp.asnumpy(xp2), cp.asnumpy(vp2)
-            Phi_p, Eg_p = Phi_cpu, Eg_cpu
-            rhot_p = rho_cpu
-            E_kin_p, E_pot_p = cp.asnumpy(E_kin_gpu), cp.asnumpy(E_pot_gpu)
-
-            # --- 绘图窗口 ---
-            fig.suptitle(f'Simulation Plots - Iteration {it}', fontsize=16)
-
-            # 速度分布图
-            axs[0, 0].cla()
-            axs[0, 0].hist(vp1_p, bins=30, ec="black", fc="blue", density=True, alpha=0.5, lw=1)
-            axs[0, 0].hist(vp2_p, bins=30, ec="black", fc="red", density=True, alpha=0.5, lw=1)
-            axs[0, 0].set_title('Velocity Distribution')
-            axs[0, 0].set_xlabel('$v$/$v_{th}$')
-            axs[0, 0].axis([v_min, v_max, 0, 0.4])
-
-            # 相空间图
-            axs[0, 1].cla()
-            axs[0, 1].scatter(xp1_p, vp1_p, s=0.1, color='blue', alpha=0.5)
-            axs[0, 1].scatter(xp2_p, vp2_p, s=0.1, color='red', alpha=0.5)
-            axs[0, 1].axis([0, L, -15, 15])
-            axs[0, 1].set_title('Phase Space')
-            axs[0, 1].set_xlabel('$x$/$\lambda_{D}$')
-
-            # 电势图
-            axs[1, 1].cla()
-            axs[1, 1].plot(Phi_p, color='orangered', linewidth=1)
-            axs[1, 1].set_title('Electric Potential')
-            axs[1, 1].set_xlabel('$x$/$\lambda_{D}$')
-
-            # 能量演化图
-            axs[0, 2].cla()
-            axs[0, 2].plot(time[:it+1], E_kin_p[:it+1], color='yellowgreen', label='Kinetic', linewidth=1)
-            axs[0, 2].plot(time[:it+1], E_pot_p[:it+1], color='orange', label='Potential', linewidth=1)
-            axs[0, 2].set_xlim([0, Nt * dt])
-            axs[0, 2].legend()
-            axs[0, 2].set_title('Energy Evolution')
-            axs[0, 2].set_xlabel('$\omega_{p,e}t$')
-
-            # 电场图
-            axs[1, 0].cla()
-            axs[1, 0].plot(Eg_p, color='royalblue', linewidth=1)
-            axs[1, 0].set_title('Electric Field')
-            axs[1, 0].set_xlabel('$x$/$\lambda_{D}$')
-
-            # 电荷密度图
-            axs[1, 2].cla()
-            axs[1, 2].plot(rhot_p, color='tomato', linewidth=1)
-            axs[1, 2].set_title('Charge Density')
-            axs[1, 2].set_xlabel('$x$/$\lambda_{D}$')
-            
-            plt.pause(0.001)
-
-            # --- 保存特定帧的图像 ---
-            if it in save_iterations:
-                print(f"\nSaving plots for iteration {it}...")
-                save_histogram_as_pdf(vp1_p, vp2_p, v0_1, v0_2, v_th, v_min, v_max, os.path.join(output_dir, f'dist_{it}.pdf'))
-                save_scatter_as_pdf(xp1_p, vp1_p, xp2_p, vp2_p, L, os.path.join(output_dir, f'phase_space_{it}.pdf'))
-                save_subplot_as_pdf(axs[1, 1], os.path.join(output_dir, f'potential_{it}.pdf'))
-                save_subplot_as_pdf(axs[0, 2], os.path.join(output_dir, f'energy_{it}.pdf'), True)
-                save_subplot_as_pdf(axs[1, 0], os.path.join(output_dir, f'efield_{it}.pdf'))
-                save_subplot_as_pdf(axs[1, 2], os.path.join(output_dir, f'rho_{it}.pdf'))
+            if pending is not None:
+                pending[1].synchronize()
+                plot_snapshot(pending[0])
+            done, staging = snapshot_to_host_async(
+                [xp[:N1], vp[:N1], xp[N1:], vp[N1:], Phi, Eg, rhot, E_kin_gpu, E_pot_gpu], snapshot_buffers, copy_stream)
+            pending = (it, done, staging)
+
+    if pending is not None:
+        pending[1].synchronize()
+        plot_snapshot(pending[0])
 
     print("Simulation finished.")
     plt.show()
@@ -0,0 +1,118 @@
+import math
+import numpy as np
+from numba import njit, prange, get_num_threads
+
+# --------------------------------------------------------------------------
+# CPU BACKEND (NumPy + Numba)
+#
+# Used when CUDA is not available. The particle loops run in parallel with
+# prange; every thread deposits into its own copy of the grid, and the copies
+# are summed afterwards instead of using atomics.
+# --------------------------------------------------------------------------
+
+def charge(re_1, re_2, N_ions, N1, N2, L, wp_e):
+    """Calculates particle charges and background density."""
+    Q_1 = (wp_e**2 * L) / (N1 * re_1)
+    if re_2 > 0: Q_2 = -Q_1 * (N1 / N2)
+    elif re_2 < 0: Q_2 = Q_1 * (N1 / N2)
+    else: Q_2 = 0
+    rho_ions = (-Q_1 / L) * N_ions
+    return Q_1, Q_2, rho_ions
+
+def initial_loading(N, v_0, v_th, v_min, v_max, amplitude, mode, L):
+    """Initializes particle positions and velocities on the CPU."""
+    position = np.linspace(0, L, N, dtype=np.float64)
+    velocity = np.clip(np.random.normal(v_0, v_th, N), v_min, v_max)
+    if amplitude != 0:
+        position = position + amplitude * np.cos(2 * np.pi * mode * position / L)
+    return position, velocity
+
+def poisson_equation_preparation(Ng, dx):
+    """Prepares the inverse Laplacian symbol for the spectral Poisson solvers."""
+    k = 2 * np.pi * np.fft.rfftfreq(Ng, d=dx)
+    # Symbol of the periodic 3-point Laplacian, so the result matches the finite-difference stencil
+    k2 = (2 * np.sin(k * dx / 2) / dx) ** 2
+    inv_k2 = np.zeros_like(k2)
+    inv_k2[1:] = 1.0 / k2[1:]
+    return inv_k2
+
+@njit(cache=True, fastmath=True)
+def field_derivative(Phi, inv_2dx, out):
+    """Central-difference E = -dPhi/dx on a periodic grid in a single pass."""
+    N = Phi.shape[0]
+    for i in range(N):
+        out[i] = (Phi[(i - 1) % N] - Phi[(i + 1) % N]) * inv_2dx
+    return out
+
+def solve_field_cpu(charge_density_cpu, Ng, dx, inv_k2, Eg=None):
+    """Solves Poisson's equation on the CPU with periodic boundaries via FFT."""
+    Phi = np.fft.irfft(np.fft.rfft(charge_density_cpu) * inv_k2, n=Ng)
+    if Eg is None:
+        Eg = np.empty(Ng, dtype=np.float64)
+    field_derivative(Phi, 0.5 / dx, Eg)
+    return Phi, Eg
+
+@njit(inline='always')
+def _species_of(idx, species_start):
+    """Species are stored contiguously, so the species follows from the particle index."""
+    s = 0
+    while s + 2 < species_start.shape[0] and idx >= species_start[s + 1]:
+        s += 1
+    return s
+
+@njit(inline='always')
+def _cic(pos, inv_dx, Ng):
+    """Cloud-in-cell grid points and weights for one position."""
+    xn = pos * inv_dx
+    i = int(math.floor(xn))
+    w1 = xn - i
+    i0 = (i % Ng + Ng) % Ng
+    return i0, (i0 + 1) % Ng, 1.0 - w1, w1
+
+@njit(parallel=True, fastmath=True, cache=True)
+def deposit(xp, species_start, Q_s, inv_dx, Ng, rho_grid):
+    """Adds the CIC charge of all particles to rho_grid."""
+    N = xp.shape[0]
+    n_threads = get_num_threads()
+    chunk = (N + n_threads - 1) // n_threads
+    local = np.zeros((n_threads, Ng))
+    for t in prange(n_threads):
+        for idx in range(t * chunk, min(N, (t + 1) * chunk)):
+            q = Q_s[_species_of(idx, species_start)] * inv_dx
+            i0, i1, w0, w1 = _cic(xp[idx], inv_dx, Ng)
+            local[t, i0] += q * w0
+            local[t, i1] += q * w1
+    for t in range(n_threads):
+        for j in range(Ng):
+            rho_grid[j] += local[t, j]
+
+@njit(parallel=True, fastmath=True, cache=True)
+def push_and_deposit(xp, vp, species_start, Q_s, re_s, kinetic_weight_s, Eg, dt, inv_dx, Ng, L, rho_grid):
+    """Pushes all particles and deposits their charge at the new positions in one pass.
+
+    Mirrors push_and_deposit_kernel in pic.py. Returns the kinetic energy after the push.
+    """
+    N = xp.shape[0]
+    n_threads = get_num_threads()
+    chunk = (N + n_threads - 1) // n_threads
+    local = np.zeros((n_threads, Ng))
+    ek = np.zeros(n_threads)
+    for t in prange(n_threads):
+        for idx in range(t * chunk, min(N, (t + 1) * chunk)):
+            s = _species_of(idx, species_start)
+            i0, i1, w0, w1 = _cic(xp[idx], inv_dx, Ng)
+            v = vp[idx] + re_s[s] * (Eg[i0] * w0 + Eg[i1] * w1) * dt
+            pos = math.fmod(xp[idx] + v * dt, L)
+            if pos < 0:
+                pos += L
+            xp[idx] = pos
+            vp[idx] = v
+            ek[t] += kinetic_weight_s[s] * v * v
+            q = Q_s[s] * inv_dx
+            i0, i1, w0, w1 = _cic(pos, inv_dx, Ng)
+            local[t, i0] += q * w0
+            local[t, i1] += q * w1
+    for t in range(n_threads):
+        for j in range(Ng):
+            rho_grid[j] += local[t, j]
+    return ek.sum()
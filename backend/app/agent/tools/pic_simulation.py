@@ -3,18 +3,33 @@ import asyncio
 import threading
 import base64
 import io
+import logging
 import os
+from functools import lru_cache
 from typing import Dict, Any
-import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 from qwen_agent.tools.base import BaseTool, register_tool
-from .pic.pic import (
-    initial_loading, charge, poisson_equation_preparation, 
-    solve_field_cpu, deposit_charge_kernel, push_particles_kernel
-)
-import cupy as cp
-from scipy.sparse import spdiags, csc_matrix
+from .pic import pic_cpu
+from .pic.pic_cpu import charge
+
+# Prefer the CUDA backend; fall back to the Numba CPU backend when CuPy or a GPU is missing
+try:
+    import cupy as cp
+    from .pic.pic import (
+        initial_loading, poisson_equation_preparation_gpu, 
+        solve_field_gpu, deposit_charge_kernel, push_and_deposit_kernel, deposit_sorted,
+        deposit_sorted_kernel, sum_sq, merge_species, kernel_block_sizes, grid_blocks
+    )
+    GPU_AVAILABLE = cp.cuda.is_available()
+except ImportError:
+    cp = None
+    GPU_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
 
 @register_tool('pic_simulation')
 class PICSimulation(BaseTool):
@@ -66,11 +81,53 @@ class PICSimulation(BaseTool):
             'default': 256
         }
     ]
+    
+    # Process-wide caches shared by every instance, so repeated agent calls skip cold-start costs
+    _kernels_compiled = False
+    _gpu_usable = GPU_AVAILABLE
+    _figure = None
+    _figure_lock = threading.Lock()
 
     def __init__(self, tool_cfg=None):
         super().__init__(tool_cfg)
-        self.simulation_data = {}
-        self.is_running = False
+        self.backend = 'gpu' if PICSimulation._gpu_usable else 'cpu'
+        
+        # Compile the CUDA kernels once up front instead of on the first simulation step.
+        # This runs while the backend starts up, so a broken CUDA toolchain falls back to the CPU backend.
+        if self.backend == 'gpu' and not PICSimulation._kernels_compiled:
+            try:
+                for kernel in (deposit_charge_kernel, push_and_deposit_kernel, deposit_sorted_kernel):
+                    kernel.compile()
+                # Elementwise and reduction kernels compile on first launch, so run them on a tiny grid
+                Ng = 8
+                _, Eg = solve_field_gpu(cp.zeros(Ng), Ng, 1.0, poisson_equation_preparation_gpu(Ng, 1.0))
+                sum_sq(Eg)
+                cp.cuda.Device().synchronize()
+                PICSimulation._kernels_compiled = True
+            except Exception as e:
+                logger.warning(f"CUDA kernel warm-up failed, using the CPU backend: {e}")
+                PICSimulation._gpu_usable = False
+                self.backend = 'cpu'
+    
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _get_inv_k2(backend: str, Ng: int, dx: float):
+        """Return the cached Poisson symbol for this grid on the given backend.
+
+        grid_size comes from the request, so only the most recently used grids are kept.
+        """
+        if backend == 'gpu':
+            return poisson_equation_preparation_gpu(Ng, dx)
+        return pic_cpu.poisson_equation_preparation(Ng, dx)
+    
+    @classmethod
+    def _get_figure(cls) -> Figure:
+        """Return the shared, cleared animation figure (caller must hold _figure_lock)."""
+        if cls._figure is None:
+            cls._figure = Figure(figsize=(12, 10))
+            FigureCanvasAgg(cls._figure)
+        cls._figure.clf()
+        return cls._figure
         
     def call(self, params: str, **kwargs) -> str:
         """Execute PIC simulation with given parameters."""
@@ -150,79 +207,50 @@ class PICSimulation(BaseTool):
             v0_1, v0_2 = 0.0, 0.0
             re_1, re_2 = -1.0, -1.0
         
-        # Initialize particles
-        xp1_cpu, vp1_cpu = initial_loading(N1, v0_1, v_th, v_min, v_max, 0.1, 1, L)
-        xp2_cpu, vp2_cpu = initial_loading(N2, v0_2, v_th, v_min, v_max, 0.1, 1, L)
-        
-        # Transfer to GPU
-        xp1, vp1 = cp.asarray(xp1_cpu), cp.asarray(vp1_cpu)
-        xp2, vp2 = cp.asarray(xp2_cpu), cp.asarray(vp2_cpu)
-        
-        # Setup simulation
         Q1, Q2, rho_ions = charge(re_1, re_2, N_ions, N1, N2, L, wp_e)
-        Ax = poisson_equation_preparation(Ng)
         
-        # Storage for results
-        frames = []
         save_interval = max(1, steps // 50)  # Save up to 50 frames
+        frame_iterations = [it for it in range(steps) if it % save_interval == 0 or it == steps - 1]
         
-        threads_per_block = 256
-        blocks_per_grid_N1 = (N1 + threads_per_block - 1) // threads_per_block
-        blocks_per_grid_N2 = (N2 + threads_per_block - 1) // threads_per_block
+        cfg = {
+            'L': L, 'Ng': Ng, 'dx': dx, 'dt': dt, 'steps': steps,
+            'v_th': v_th, 'v_min': v_min, 'v_max': v_max,
+            'N1': N1, 'N2': N2, 'v0_1': v0_1, 'v0_2': v0_2,
+            're_1': re_1, 're_2': re_2, 'Q1': Q1, 'Q2': Q2, 'rho_ions': rho_ions,
+            'frame_iterations': frame_iterations
+        }
+        if self.backend == 'gpu':
+            arrays = self._run_gpu(cfg)
+        else:
+            arrays = self._run_cpu(cfg)
         
-        # Main simulation loop
-        for it in range(steps):
-            # Charge deposition
-            rho_grid = cp.zeros(Ng, dtype=cp.float64)
-            deposit_charge_kernel((blocks_per_grid_N1,), (threads_per_block,), 
-                                (xp1, N1, Q1, dx, Ng, rho_grid))
-            deposit_charge_kernel((blocks_per_grid_N2,), (threads_per_block,), 
-                                (xp2, N2, Q2, dx, Ng, rho_grid))
-            rho_grid += rho_ions
-            
-            # Solve Poisson equation
-            rho_cpu = cp.asnumpy(rho_grid)
-            Phi_cpu, Eg_cpu = solve_field_cpu(rho_cpu, Ng, dx, Ax)
-            Eg = cp.asarray(Eg_cpu)
-            
-            # Push particles
-            push_particles_kernel((blocks_per_grid_N1,), (threads_per_block,), 
-                                (xp1, vp1, N1, Eg, re_1, dt, dx, Ng, L))
-            push_particles_kernel((blocks_per_grid_N2,), (threads_per_block,), 
-                                (xp2, vp2, N2, Eg, re_2, dt, dx, Ng, L))
-            
-            # Save frame data
-            if it % save_interval == 0 or it == steps - 1:
-                xp1_frame = cp.asnumpy(xp1)
-                vp1_frame = cp.asnumpy(vp1)
-                xp2_frame = cp.asnumpy(xp2)
-                vp2_frame = cp.asnumpy(vp2)
-                
-                frame_data = {
-                    'iteration': it,
-                    'time': it * dt,
-                    'phase_space': {
-                        'beam1': {
-                            'positions': xp1_frame.tolist(),
-                            'velocities': vp1_frame.tolist()
-                        },
-                        'beam2': {
-                            'positions': xp2_frame.tolist(), 
-                            'velocities': vp2_frame.tolist()
-                        }
-                    },
-                    'fields': {
-                        'electric_field': Eg_cpu.tolist(),
-                        'potential': Phi_cpu.tolist(),
-                        'charge_density': rho_cpu.tolist()
+        frames = []
+        for k, it in enumerate(frame_iterations):
+            frame_data = {
+                'iteration': it,
+                'time': it * dt,
+                'phase_space': {
+                    'beam1': {
+                        'positions': arrays['xp1'][k],
+                        'velocities': arrays['vp1'][k]
                     },
-                    'grid_info': {
-                        'L': L,
-                        'Ng': Ng,
-                        'dx': dx
+                    'beam2': {
+                        'positions': arrays['xp2'][k], 
+                        'velocities': arrays['vp2'][k]
                     }
+                },
+                'fields': {
+                    'electric_field': arrays['Eg'][k],
+                    'potential': arrays['Phi'][k],
+                    'charge_density': arrays['rho'][k]
+                },
+                'grid_info': {
+                    'L': L,
+                    'Ng': Ng,
+                    'dx': dx
                 }
-                frames.append(frame_data)
+            }
+            frames.append(frame_data)
         
         return {
             'frames': frames,
@@ -235,6 +263,148 @@ class PICSimulation(BaseTool):
             }
         }
     
+    def _run_gpu(self, cfg: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """Run the simulation loop with the CuPy kernels; returns host arrays of the saved frames."""
+        L, Ng, dx, dt, steps = cfg['L'], cfg['Ng'], cfg['dx'], cfg['dt'], cfg['steps']
+        N1, N2 = cfg['N1'], cfg['N2']
+        inv_dx = 1.0 / dx
+        rho_ions = cfg['rho_ions']
+        frame_iterations = cfg['frame_iterations']
+        
+        # Initialize particles directly on the GPU
+        xp1, vp1 = initial_loading(N1, cfg['v0_1'], cfg['v_th'], cfg['v_min'], cfg['v_max'], 0.1, 1, L)
+        xp2, vp2 = initial_loading(N2, cfg['v0_2'], cfg['v_th'], cfg['v_min'], cfg['v_max'], 0.1, 1, L)
+        
+        # Merge into a single float32 particle buffer: beam 1 is xp[:N1], beam 2 is xp[N1:].
+        # Charge density, potential and energies stay float64.
+        xp, vp, species_start, species_id, Q_s, re_s, kinetic_weight_s = merge_species(
+            [xp1, xp2], [vp1, vp2], [cfg['Q1'], cfg['Q2']], [cfg['re_1'], cfg['re_2']])
+        N = N1 + N2
+        n_species = 2
+        inv_k2 = self._get_inv_k2('gpu', Ng, dx)
+        
+        # Storage for results, kept on the GPU until the loop finishes
+        n_frames = len(frame_iterations)
+        frames_xp1 = cp.empty((n_frames, N1), dtype=cp.float32)
+        frames_vp1 = cp.empty((n_frames, N1), dtype=cp.float32)
+        frames_xp2 = cp.empty((n_frames, N2), dtype=cp.float32)
+        frames_vp2 = cp.empty((n_frames, N2), dtype=cp.float32)
+        frames_Eg = cp.empty((n_frames, Ng), dtype=cp.float32)
+        frames_Phi = cp.empty((n_frames, Ng), dtype=cp.float64)
+        frames_rho = cp.empty((n_frames, Ng), dtype=cp.float64)
+        frame_idx = 0
+        
+        DEPOSIT_TPB, PUSH_TPB = kernel_block_sizes()
+        sort_interval = 20  # Sort by cell and deposit without atomics every sort_interval steps
+        deposit_blocks = grid_blocks(N, DEPOSIT_TPB)
+        push_blocks = grid_blocks(N, PUSH_TPB)
+        
+        # Initial charge deposition; afterwards the fused kernel deposits at the pushed positions.
+        # Two preallocated density buffers alternate: rhot holds the density solved this step,
+        # rho_grid receives the deposit for the next one.
+        rho_grid = cp.zeros(Ng, dtype=cp.float64)
+        rhot = cp.zeros(Ng, dtype=cp.float64)
+        Eg = cp.empty(Ng, dtype=cp.float32)
+        deposit_charge_kernel((deposit_blocks,), (DEPOSIT_TPB,), 
+                            (xp, N, species_start, n_species, Q_s, inv_dx, Ng, rho_grid))
+        
+        # Main simulation loop
+        for it in range(steps):
+            rho_grid += rho_ions
+            
+            # Solve Poisson equation
+            Phi, Eg = solve_field_gpu(rho_grid, Ng, dx, inv_k2, Eg)
+            
+            # Push particles and deposit charge for the next step
+            rhot, rho_grid = rho_grid, rhot
+            cp.cuda.runtime.memsetAsync(rho_grid.data.ptr, 0, rho_grid.nbytes,
+                                        cp.cuda.get_current_stream().ptr)
+            # A null E_kin pointer skips the kinetic energy diagnostic, which the tool does not report
+            sort_step = it % sort_interval == 0
+            push_and_deposit_kernel((push_blocks,), (PUSH_TPB,), 
+                                (xp, vp, N, species_start, n_species, Q_s, re_s, kinetic_weight_s,
+                                 Eg, dt, inv_dx, Ng, L, rho_grid, 0 if sort_step else 1, 0))
+            if sort_step:
+                xp, vp = deposit_sorted(xp, vp, species_id, Q_s, inv_dx, Ng, rho_grid, DEPOSIT_TPB)
+            
+            # Save frame data
+            if frame_idx < n_frames and it == frame_iterations[frame_idx]:
+                frames_xp1[frame_idx] = xp[:N1]
+                frames_vp1[frame_idx] = vp[:N1]
+                frames_xp2[frame_idx] = xp[N1:]
+                frames_vp2[frame_idx] = vp[N1:]
+                frames_Eg[frame_idx] = Eg
+                frames_Phi[frame_idx] = Phi
+                frames_rho[frame_idx] = rhot
+                frame_idx += 1
+        
+        # Transfer all frames to the host at once
+        return {
+            'xp1': cp.asnumpy(frames_xp1), 'vp1': cp.asnumpy(frames_vp1),
+            'xp2': cp.asnumpy(frames_xp2), 'vp2': cp.asnumpy(frames_vp2),
+            'Eg': cp.asnumpy(frames_Eg), 'Phi': cp.asnumpy(frames_Phi), 'rho': cp.asnumpy(frames_rho)
+        }
+    
+    def _run_cpu(self, cfg: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """Run the simulation loop with the Numba CPU backend; returns arrays of the saved frames."""
+        L, Ng, dx, dt, steps = cfg['L'], cfg['Ng'], cfg['dx'], cfg['dt'], cfg['steps']
+        N1, N2 = cfg['N1'], cfg['N2']
+        inv_dx = 1.0 / dx
+        rho_ions = cfg['rho_ions']
+        frame_iterations = cfg['frame_iterations']
+        
+        # Initialize particles in a single buffer: beam 1 is xp[:N1], beam 2 is xp[N1:]
+        xp1, vp1 = pic_cpu.initial_loading(N1, cfg['v0_1'], cfg['v_th'], cfg['v_min'], cfg['v_max'], 0.1, 1, L)
+        xp2, vp2 = pic_cpu.initial_loading(N2, cfg['v0_2'], cfg['v_th'], cfg['v_min'], cfg['v_max'], 0.1, 1, L)
+        xp = np.concatenate([xp1, xp2])
+        vp = np.concatenate([vp1, vp2])
+        species_start = np.array([0, N1, N1 + N2], dtype=np.int64)
+        Q_s = np.array([cfg['Q1'], cfg['Q2']], dtype=np.float64)
+        re_s = np.array([cfg['re_1'], cfg['re_2']], dtype=np.float64)
+        kinetic_weight_s = 0.5 * np.abs(Q_s / re_s)
+        inv_k2 = self._get_inv_k2('cpu', Ng, dx)
+        
+        n_frames = len(frame_iterations)
+        frames_xp1 = np.empty((n_frames, N1))
+        frames_vp1 = np.empty((n_frames, N1))
+        frames_xp2 = np.empty((n_frames, N2))
+        frames_vp2 = np.empty((n_frames, N2))
+        frames_Eg = np.empty((n_frames, Ng))
+        frames_Phi = np.empty((n_frames, Ng))
+        frames_rho = np.empty((n_frames, Ng))
+        frame_idx = 0
+        
+        rho_grid = np.zeros(Ng, dtype=np.float64)
+        rhot = np.zeros(Ng, dtype=np.float64)
+        Eg = np.empty(Ng, dtype=np.float64)
+        pic_cpu.deposit(xp, species_start, Q_s, inv_dx, Ng, rho_grid)
+        
+        # Main simulation loop
+        for it in range(steps):
+            rho_grid += rho_ions
+            Phi, Eg = pic_cpu.solve_field_cpu(rho_grid, Ng, dx, inv_k2, Eg)
+            
+            rhot, rho_grid = rho_grid, rhot
+            rho_grid.fill(0.0)
+            pic_cpu.push_and_deposit(xp, vp, species_start, Q_s, re_s, kinetic_weight_s,
+                                     Eg, dt, inv_dx, Ng, L, rho_grid)
+            
+            # Save frame data
+            if frame_idx < n_frames and it == frame_iterations[frame_idx]:
+                frames_xp1[frame_idx] = xp[:N1]
+                frames_vp1[frame_idx] = vp[:N1]
+                frames_xp2[frame_idx] = xp[N1:]
+                frames_vp2[frame_idx] = vp[N1:]
+                frames_Eg[frame_idx] = Eg
+                frames_Phi[frame_idx] = Phi
+                frames_rho[frame_idx] = rhot
+                frame_idx += 1
+        
+        return {
+            'xp1': frames_xp1, 'vp1': frames_vp1, 'xp2': frames_xp2, 'vp2': frames_vp2,
+            'Eg': frames_Eg, 'Phi': frames_Phi, 'rho': frames_rho
+        }
+    
     def _generate_gif_animation(self, simulation_data: Dict[str, Any], simulation_type: str) -> str:
         """Generate GIF animation for PIC simulation"""
         try:
@@ -252,76 +422,110 @@ class PICSimulation(BaseTool):
             gif_filename = f'pic_simulation_{simulation_type}_{timestamp}.gif'
             gif_path = os.path.join(output_dir, gif_filename)
             
-            # Set up figure
-            fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(12, 10))
-            fig.suptitle(f'PIC Simulation: {simulation_type}', fontsize=16)
+            # Select a subset of frames to reduce file size
+            frame_step = max(1, len(frames) // 30)  # Up to 30 frames
+            selected_frames = list(range(0, len(frames), frame_step))
+            
+            L = frames[0]['grid_info']['L']
+            x_grid = np.linspace(0, L, len(frames[0]['fields']['electric_field']))
+            
+            # Fixed axis limits and histogram bins, so the artists can be created once and only updated
+            v_lim = 1.05 * max(
+                np.abs(frames[i]['phase_space'][beam]['velocities']).max()
+                for i in selected_frames for beam in ('beam1', 'beam2')
+            )
+            bin_edges = np.linspace(0, L, 51)
+            counts1 = {i: np.histogram(frames[i]['phase_space']['beam1']['positions'], bins=bin_edges)[0] for i in selected_frames}
+            counts2 = {i: np.histogram(frames[i]['phase_space']['beam2']['positions'], bins=bin_edges)[0] for i in selected_frames}
+            count_max = max(max(c.max() for c in counts1.values()), max(c.max() for c in counts2.values()))
+            
+            def field_limits(name):
+                lo = min(frames[i]['fields'][name].min() for i in selected_frames)
+                hi = max(frames[i]['fields'][name].max() for i in selected_frames)
+                pad = 0.05 * (hi - lo) or 1e-6
+                return lo - pad, hi + pad
+            
+            # The shared figure is reused across calls, so only one animation renders at a time
+            with PICSimulation._figure_lock:
+                # Set up figure
+                fig = self._get_figure()
+                ((ax1, ax2), (ax3, ax4)) = fig.subplots(2, 2)
+                fig.suptitle(f'PIC Simulation: {simulation_type}', fontsize=16)
             
-            def animate(frame_idx):
-                if frame_idx >= len(frames):
-                    return
-                    
-                frame = frames[frame_idx]
-                
-                # Clear all subplots
-                ax1.clear()
-                ax2.clear()
-                ax3.clear()
-                ax4.clear()
-                
                 # Phase space plot
-                beam1_pos = np.array(frame['phase_space']['beam1']['positions'])
-                beam1_vel = np.array(frame['phase_space']['beam1']['velocities'])
-                beam2_pos = np.array(frame['phase_space']['beam2']['positions'])
-                beam2_vel = np.array(frame['phase_space']['beam2']['velocities'])
-                
-                ax1.scatter(beam1_pos, beam1_vel, c='blue', alpha=0.6, s=1, label='Beam 1')
-                ax1.scatter(beam2_pos, beam2_vel, c='red', alpha=0.6, s=1, label='Beam 2')
+                scatter1 = ax1.scatter([], [], c='blue', alpha=0.6, s=1, label='Beam 1')
+                scatter2 = ax1.scatter([], [], c='red', alpha=0.6, s=1, label='Beam 2')
+                ax1.set_xlim(0, L)
+                ax1.set_ylim(-v_lim, v_lim)
                 ax1.set_xlabel('Position')
                 ax1.set_ylabel('Velocity')
                 ax1.set_title('Phase Space Distribution')
-                ax1.legend()
+                ax1.legend(loc='upper right')
                 ax1.grid(True, alpha=0.3)
-                
+                time_text = ax1.text(0.02, 0.95, '', transform=ax1.transAxes)
+            
                 # Position distribution
-                ax2.hist(beam1_pos, bins=50, alpha=0.7, color='blue', label='Beam 1')
-                ax2.hist(beam2_pos, bins=50, alpha=0.7, color='red', label='Beam 2')
+                bars1 = ax2.bar(bin_edges[:-1], np.zeros(len(bin_edges) - 1), width=np.diff(bin_edges),
+                                align='edge', alpha=0.7, color='blue', label='Beam 1')
+                bars2 = ax2.bar(bin_edges[:-1], np.zeros(len(bin_edges) - 1), width=np.diff(bin_edges),
+                                align='edge', alpha=0.7, color='red', label='Beam 2')
+                ax2.set_xlim(0, L)
+                ax2.set_ylim(0, 1.05 * count_max)
                 ax2.set_xlabel('Position')
                 ax2.set_ylabel('Particle Count')
                 ax2.set_title('Position Distribution')
                 ax2.legend()
-                
+            
                 # Electric field
-                x_grid = np.linspace(0, frame['grid_info']['L'], len(frame['fields']['electric_field']))
-                ax3.plot(x_grid, frame['fields']['electric_field'], 'g-', linewidth=2)
+                line_E, = ax3.plot(x_grid, np.zeros_like(x_grid), 'g-', linewidth=2)
+                ax3.set_xlim(0, L)
+                ax3.set_ylim(*field_limits('electric_field'))
                 ax3.set_xlabel('Position')
                 ax3.set_ylabel('Electric Field')
                 ax3.set_title('Electric Field Distribution')
                 ax3.grid(True, alpha=0.3)
-                
+            
                 # Charge density
-                ax4.plot(x_grid, frame['fields']['charge_density'], 'm-', linewidth=2)
+                line_rho, = ax4.plot(x_grid, np.zeros_like(x_grid), 'm-', linewidth=2)
+                ax4.set_xlim(0, L)
+                ax4.set_ylim(*field_limits('charge_density'))
                 ax4.set_xlabel('Position')
                 ax4.set_ylabel('Charge Density')
                 ax4.set_title('Charge Density Distribution')
                 ax4.grid(True, alpha=0.3)
+            
+                fig.tight_layout()
+            
+                artists = [scatter1, scatter2, time_text, line_E, line_rho, *bars1, *bars2]
+            
+                def init():
+                    return artists
+            
+                def animate(frame_idx):
+                    frame = frames[frame_idx]
+                    beam1 = frame['phase_space']['beam1']
+                    beam2 = frame['phase_space']['beam2']
                 
-                # Add time info
-                fig.suptitle(f'PIC Simulation: {simulation_type} (t={frame["time"]:.2f})', fontsize=16)
+                    scatter1.set_offsets(np.column_stack([beam1['positions'], beam1['velocities']]))
+                    scatter2.set_offsets(np.column_stack([beam2['positions'], beam2['velocities']]))
+                    for bar, height in zip(bars1, counts1[frame_idx]):
+                        bar.set_height(height)
+                    for bar, height in zip(bars2, counts2[frame_idx]):
+                        bar.set_height(height)
+                    line_E.set_ydata(frame['fields']['electric_field'])
+                    line_rho.set_ydata(frame['fields']['charge_density'])
+                    time_text.set_text(f't={frame["time"]:.2f}')
                 
-                plt.tight_layout()
+                    return artists
             
-            # Create animation (select a subset of frames to reduce file size)
-            frame_step = max(1, len(frames) // 30)  # Up to 30 frames
-            selected_frames = list(range(0, len(frames), frame_step))
-            
-            anim = animation.FuncAnimation(
-                fig, animate, frames=selected_frames, 
-                interval=200, repeat=True, blit=False
-            )
+                anim = animation.FuncAnimation(
+                    fig, animate, frames=selected_frames, init_func=init,
+                    interval=200, repeat=True, blit=True
+                )
             
-            # Save GIF
-            anim.save(gif_path, writer='pillow', fps=5, dpi=80)
-            plt.close(fig)
+                # Save GIF
+                anim.save(gif_path, writer='pillow', fps=5, dpi=80)
+                fig.clf()
             
             print(f"GIF saved to: {gif_path}")
             return gif_path
@@ -1,19 +1,28 @@
 import socketio
 import asyncio
 import logging
+import msgspec
 from app.services.llm_service import llm_service
-from typing import Dict
+from typing import Dict, List, Set
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
-# 创建一个 ASGI 兼容的 Socket.IO 服务器实例
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+# 创建一个 ASGI 兼容的 Socket.IO 服务器实例；数据包使用 MessagePack 编码，
+# 比 JSON 更紧凑，解析也更快（前端使用 src/msgpackParser.ts 中对应的解析器）
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*", serializer="msgpack")
 
 # 存储每个 socket 连接（sid）对应的自定义会话ID
 # 这层映射将 socketio 的临时 sid 与我们持久化的会话逻辑解耦
 connection_sessions: Dict[str, str] = {}
 
+# 每个连接正在处理消息的任务，断开连接时全部取消
+message_tasks: Dict[str, Set[asyncio.Task]] = {}
+
+# 在 EMIT_BATCH_WINDOW 秒内到达的片段合并为一次 response_chunk，最多合并 EMIT_BATCH_SIZE 个
+EMIT_BATCH_SIZE = 16
+EMIT_BATCH_WINDOW = 0.008
+
 
 @sio.event
 async def connect(sid, environ):
@@ -38,8 +47,13 @@ async def disconnect(sid):
     """
     logger.info(f"Client disconnected: sid={sid}")
     
+    for task in message_tasks.pop(sid, ()):
+        task.cancel()
+    
     if sid in connection_sessions:
         session_id = connection_sessions.pop(sid)
+        # 先中止仍在进行的生成，再清理会话
+        llm_service.stop_generation(session_id)
         llm_service.clear_session(session_id)
         logger.info(f"Cleaned up session {session_id} for disconnected client {sid}")
 
@@ -52,7 +66,7 @@ async def message(sid, data):
     接收数据: {'message': str}
     发送事件: 
       - 'generation_started': 通知客户端开始处理。
-      - 'response_chunk': 流式发送AI响应的片段。
+      - 'response_chunk': 流式发送AI响应的片段，{'chunk': str, 'seq': int}。
       - 'generation_completed': 通知客户端响应已全部发送完毕。
       - 'error': 发生错误时发送。
     """
@@ -67,58 +81,79 @@ async def message(sid, data):
         
     logger.info(f"Received message from session {session_id}: '{user_message[:100]}...'")
     
+    # 停止生成后旧任务可能仍在收尾，同一连接可能同时有多个任务
+    task = asyncio.current_task()
+    message_tasks.setdefault(sid, set()).add(task)
     try:
         await sio.emit("generation_started", {"message": "AI正在思考中..."}, room=sid)
         
-        full_response = ""
-        async for chunk in llm_service.generate_response_stream(session_id, user_message):
-            if chunk:
-                full_response += chunk
-                
-                # 检查是否包含PIC模拟数据
-                pic_data = None
-                if '"visualization_type": "pic_simulation"' in chunk:
-                    try:
-                        # 提取PIC模拟数据
-                        import json
-                        import re
-                        json_match = re.search(r'\{.*"visualization_type":\s*"pic_simulation".*\}', chunk, re.DOTALL)
-                        if json_match:
-                            pic_data = json.loads(json_match.group())
-                            logger.info(f"Extracted PIC data with {len(pic_data.get('data', {}).get('frames', []))} frames")
-                    except Exception as e:
-                        logger.error(f"Failed to parse PIC data: {e}")
+        full_response_parts: List[str] = []
+        
+        loop = asyncio.get_running_loop()
+        pending: List[str] = []  # 尚未发送的片段
+        seq = 0
+        last_flush = loop.time()
+        
+        async def flush():
+            # 客户端自行累计内容，这里只发送新增片段和序号
+            nonlocal seq, last_flush
+            await sio.emit("response_chunk", {"chunk": "".join(pending), "seq": seq}, room=sid)
+            pending.clear()
+            seq += 1
+            last_flush = loop.time()
+        
+        stream = llm_service.generate_response_stream(session_id, user_message)
+        next_chunk = None  # 正在等待的下一个片段
+        try:
+            while True:
+                if next_chunk is None:
+                    next_chunk = asyncio.ensure_future(stream.__anext__())
+                # 有待发送内容时最多等到窗口截止，避免模型停顿（如执行工具）期间已生成的内容被滞留
+                timeout = None
+                if pending:
+                    timeout = max(0.0, last_flush + EMIT_BATCH_WINDOW - loop.time())
+                finished, _ = await asyncio.wait({next_chunk}, timeout=timeout)
+                if not finished:
+                    await flush()
+                    continue
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    next_chunk = None
+                if not chunk:
+                    continue
                 
-                await sio.emit("response_chunk", {
-                    "chunk": chunk,
-                    "full_response": full_response,
-                    "pic_data": pic_data
-                }, room=sid)
+                full_response_parts.append(chunk)
                 
-                # 如果有PIC数据，发送canvas展开信号
-                if pic_data:
-                    # 获取完整的模拟数据
-                    full_simulation_data = pic_data
-                    if pic_data.get('full_data_available'):
-                        # 尝试从工具实例获取完整数据
-                        from app.agent.tools.pic_simulation import PICSimulation
-                        try:
-                            # 这里需要找到正确的工具实例
-                            # 暂时使用概览数据，后续可以优化
-                            pass
-                        except:
-                            pass
-                    
-                    await sio.emit("canvas_expand", {
-                        "simulation_data": full_simulation_data
-                    }, room=sid)
-                    logger.info(f"Sent canvas_expand event with PIC data")
-
+                # 合并短时间内到达的片段
+                pending.append(chunk)
+                if len(pending) >= EMIT_BATCH_SIZE or loop.time() - last_flush >= EMIT_BATCH_WINDOW:
+                    await flush()
+        finally:
+            if next_chunk is not None:
+                # 取消等待中的片段会使生成器收到 CancelledError 并通知生成线程停止
+                next_chunk.cancel()
+            else:
+                await stream.aclose()
+
+        if pending:
+            await flush()
+        
+        full_response = "".join(full_response_parts)
         await sio.emit("generation_completed", {"final_response": full_response}, room=sid)
         
     except Exception as e:
         logger.error(f"Error processing message for session {session_id}: {e}", exc_info=True)
         await sio.emit("error", {"message": f"处理消息时发生错误: {str(e)}"}, room=sid)
+    
+    finally:
+        tasks = message_tasks.get(sid)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del message_tasks[sid]
 
 
 @sio.event
@@ -156,7 +191,7 @@ async def get_history(sid, _):
         return await sio.emit("error", {"message": "会话未找到"}, room=sid)
     
     history = llm_service.get_session_history(session_id)
-    await sio.emit("history", {"messages": history}, room=sid)
+    await sio.emit("history", {"messages": msgspec.to_builtins(history)}, room=sid)
 
 @sio.event
 async def clear_history(sid, _):
@@ -1,9 +1,11 @@
 import socketio
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.api.chat import sio
+from app.services.llm_service import llm_service
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +28,29 @@ static_dir = os.path.join(os.path.dirname(__file__), "..", "static")
 os.makedirs(static_dir, exist_ok=True)
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
+# 定期回收超时或超出上限的会话，防止断开事件丢失时会话无限增长
+SESSION_EVICTION_INTERVAL = 60
+
+async def _evict_sessions_periodically():
+    while True:
+        await asyncio.sleep(SESSION_EVICTION_INTERVAL)
+        try:
+            llm_service.evict_sessions()
+        except Exception as e:
+            logger.error(f"Session eviction failed: {e}", exc_info=True)
+
+@app.on_event("startup")
+async def start_session_eviction():
+    app.state.session_eviction_task = asyncio.create_task(_evict_sessions_periodically())
+
+@app.on_event("shutdown")
+async def stop_session_eviction():
+    app.state.session_eviction_task.cancel()
+
+@app.on_event("shutdown")
+async def shutdown_llm_service():
+    llm_service.shutdown()
+
 # 健康检查端点
 @app.get("/health")
 async def health_check():
@@ -40,4 +65,5 @@ socket_app = socketio.ASGIApp(sio, other_asgi_app=app)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(socket_app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # uvloop 事件循环与 httptools 解析器降低每次回调和 emit 的开销
+    uvicorn.run(socket_app, host="0.0.0.0", port=8080, loop="uvloop", http="httptools", ws="websockets")
\ No newline at end of file
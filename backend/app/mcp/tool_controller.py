@@ -1,22 +1,54 @@
-import subprocess
+import asyncio
+from collections import deque
 
 class ToolController:
-    def run_scientific_tool(self, tool_name: str, args: list[str]) -> str:
+    async def run_scientific_tool(self, tool_name: str, args: list[str],
+                                  timeout: float = 300.0, max_output_bytes: int = 1 << 20) -> str:
         """
         This is a placeholder for running scientific tools.
         In a real application, you would have more sophisticated logic
         for managing different tools and their environments.
+
+        The tool runs without blocking the event loop; only the last
+        max_output_bytes of stdout and stderr are kept, and the process is
+        killed if it does not finish within timeout seconds.
         """
         try:
-            result = subprocess.run(
-                [tool_name] + args,
-                capture_output=True,
-                text=True,
-                check=True,
+            proc = await asyncio.create_subprocess_exec(
+                tool_name, *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
             )
-            return result.stdout
         except FileNotFoundError:
             return f"Error: Tool '{tool_name}' not found."
-        except subprocess.CalledProcessError as e:
-            return f"Error executing tool '{tool_name}':\n{e.stderr}"
 
+        async def _drain(stream: asyncio.StreamReader) -> bytes:
+            chunks: deque[bytes] = deque()
+            size = 0
+            while True:
+                chunk = await stream.read(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+                while size - len(chunks[0]) >= max_output_bytes:
+                    size -= len(chunks.popleft())
+            return b"".join(chunks)[-max_output_bytes:]
+
+        try:
+            stdout, stderr, _ = await asyncio.wait_for(
+                asyncio.gather(_drain(proc.stdout), _drain(proc.stderr), proc.wait()),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                # The process exited right after the timeout.
+                pass
+            await proc.wait()
+            return f"Error: Tool '{tool_name}' timed out after {timeout} seconds."
+
+        if proc.returncode != 0:
+            return f"Error executing tool '{tool_name}':\n{stderr.decode(errors='replace')}"
+        return stdout.decode(errors='replace')
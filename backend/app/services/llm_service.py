@@ -1,8 +1,14 @@
 import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
 from typing import AsyncGenerator, Dict, Any, List, Optional
 
 from qwen_agent.agents import Assistant
 import logging
+import msgspec
 
 # 导入工具以确保它们被注册
 from app.agent.tools import PICSimulation, KcatPredict
@@ -10,10 +16,23 @@ from app.agent.tools import PICSimulation, KcatPredict
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
-# 定义消息和会话状态的类型别名，增强可读性
-Message = Dict[str, Any]
+class Message(msgspec.Struct, gc=False):
+    """
+    会话历史中的一条消息。字段均为字符串，不会形成引用环，因此关闭 GC 跟踪。
+    """
+    role: str
+    content: str
+
+# 定义会话状态的类型别名，增强可读性
 SessionState = Dict[str, Any]
 
+# 会话在无活动 SESSION_TTL 秒后被回收，总数超过 MAX_SESSIONS 时淘汰最久未使用的会话
+SESSION_TTL = 1800
+MAX_SESSIONS = 10_000
+
+# 执行 bot.run 的线程数，同时也是 Assistant 实例池的上限
+LLM_WORKERS = 128
+
 class LLMService:
     """
     封装了与Qwen LLM的交互，并管理多用户会话的核心服务。
@@ -54,14 +73,61 @@ class LLMService:
 请用中文回复用户。'''
         
         # 初始化 qwen-agent 助手
-        self.bot = Assistant(
+        self.bot = self._create_bot()
+        
+        # Assistant 实例不保证线程安全，每次生成从池中借出一个独占实例；
+        # 池按需扩容，最多 LLM_WORKERS 个
+        self._bot_pool: asyncio.Queue = asyncio.Queue()
+        self._bot_pool.put_nowait(self.bot)
+        self._bot_count = 1
+        
+        # bot.run 的调用主要在等待远程模型服务，使用独立且足够大的线程池，
+        # 避免多会话并发时在默认执行器中排队
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm-bot")
+        
+        # 存储活跃的会话，以 session_id 为键；按最近使用顺序排列，便于 LRU 淘汰
+        self.active_sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+
+    def _create_bot(self) -> Assistant:
+        """
+        按当前配置创建一个新的 qwen-agent 助手实例。
+        """
+        return Assistant(
             llm=self.llm_cfg,
             system_message=self.system,
             function_list=self.tools
         )
-        
-        # 存储活跃的会话，以 session_id 为键
-        self.active_sessions: Dict[str, SessionState] = {}
+
+    async def _acquire_bot(self) -> Assistant:
+        """
+        从实例池借出一个助手；池中无空闲实例且未达上限时新建一个。
+
+        Returns:
+            Assistant: 供本次生成独占使用的助手实例，用完后需放回 self._bot_pool。
+        """
+        if self._bot_pool.empty() and self._bot_count < LLM_WORKERS:
+            self._bot_count += 1
+            # 创建助手会初始化工具，放到线程池中以免阻塞事件循环
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._create_bot)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 调用方被取消时创建仍在进行，完成后把实例放回池中，避免永久占用一个名额
+                future.add_done_callback(self._reclaim_bot)
+                raise
+            except Exception:
+                self._bot_count -= 1
+                raise
+        return await self._bot_pool.get()
+
+    def _reclaim_bot(self, future: asyncio.Future) -> None:
+        """
+        回收调用方已取消的助手创建结果：成功则放回实例池，失败则释放名额。
+        """
+        if future.cancelled() or future.exception() is not None:
+            self._bot_count -= 1
+        else:
+            self._bot_pool.put_nowait(future.result())
 
     def create_session(self, session_id: str) -> None:
         """
@@ -75,14 +141,60 @@ class LLMService:
         
         self.active_sessions[session_id] = {
             'messages': [],
-            'stop_flag': False,
-            'is_generating': False
+            'history': [],  # 与 messages 同步的字典形式历史，直接传给 qwen-agent
+            'cancel': threading.Event(),  # 当前这次生成的取消令牌，每次生成时替换
+            'is_generating': False,
+            'last_activity': time.time()
         }
+        self.active_sessions.move_to_end(session_id)
         logger.info(f"Created session: {session_id}")
 
+    def _touch(self, session_id: str) -> None:
+        """
+        更新会话的最近活动时间，并将其移到 LRU 顺序的末尾。
+
+        Args:
+            session_id (str): 目标会话的标识符。
+        """
+        self.active_sessions[session_id]['last_activity'] = time.time()
+        self.active_sessions.move_to_end(session_id)
+
+    def evict_sessions(self) -> int:
+        """
+        回收超时的会话，并在会话数超过上限时淘汰最久未使用的会话。
+
+        正在生成响应的会话不会被回收，否则生成结束时 add_message 会以残缺的历史重建该会话。
+
+        Returns:
+            int: 被回收的会话数量。
+        """
+        now = time.time()
+        expired = [
+            session_id for session_id, session in self.active_sessions.items()
+            if now - session['last_activity'] > SESSION_TTL and not session['is_generating']
+        ]
+        for session_id in expired:
+            del self.active_sessions[session_id]
+        
+        excess = len(self.active_sessions) - MAX_SESSIONS
+        if excess > 0:
+            # 按 LRU 顺序淘汰，跳过正在生成的会话
+            lru = list(islice((
+                session_id for session_id, session in self.active_sessions.items()
+                if not session['is_generating']
+            ), excess))
+            for session_id in lru:
+                del self.active_sessions[session_id]
+            expired.extend(lru)
+        
+        evicted = len(expired)
+        if evicted:
+            logger.info(f"Evicted {evicted} sessions, {len(self.active_sessions)} remaining")
+        return evicted
+
     def stop_generation(self, session_id: str) -> bool:
         """
-        设置停止标志，以中断指定会话的流式生成。
+        设置当前生成的取消令牌，以中断指定会话的流式生成。
 
         Args:
             session_id (str): 目标会话的标识符。
@@ -91,8 +203,8 @@ class LLMService:
             bool: 如果会话存在且成功设置标志，则返回 True，否则返回 False。
         """
         if session_id in self.active_sessions:
-            self.active_sessions[session_id]['stop_flag'] = True
-            logger.info(f"Stop flag set for session: {session_id}")
+            self.active_sessions[session_id]['cancel'].set()
+            logger.info(f"Cancel token set for session: {session_id}")
             return True
         logger.warning(f"Attempted to stop generation for non-existent session: {session_id}")
         return False
@@ -123,10 +235,10 @@ class LLMService:
         if session_id not in self.active_sessions:
             self.create_session(session_id)
         
-        self.active_sessions[session_id]['messages'].append({
-            'role': role,
-            'content': content
-        })
+        self._touch(session_id)
+        session = self.active_sessions[session_id]
+        session['messages'].append(Message(role=role, content=content))
+        session['history'].append({'role': role, 'content': content})
 
     async def generate_response_stream(self, session_id: str, user_message: str) -> AsyncGenerator[str, None]:
         """
@@ -143,36 +255,52 @@ class LLMService:
             self.create_session(session_id)
         
         session = self.active_sessions[session_id]
+        self._touch(session_id)
         
-        # 重置状态
-        session['stop_flag'] = False
+        # 每次生成使用独立的取消令牌，新消息不会撤销对上一次生成的停止请求
+        cancel = threading.Event()
+        session['cancel'] = cancel
         session['is_generating'] = True
         
         self.add_message(session_id, 'user', user_message)
         
         try:
-            messages_history = session['messages'].copy()
+            # qwen-agent 需要字典形式的消息；bot.run 内部会深拷贝，直接传入增量维护的列表即可
+            messages_history = session['history']
             
             # bot.run 是一个同步的生成器函数，不能直接在异步代码中 await。
             # 我们使用 loop.run_in_executor 将其放在一个独立的线程中运行，
-            # 以避免阻塞 FastAPI 的事件循环。
-            def _run_sync_bot() -> List[Message]:
+            # 以避免阻塞 FastAPI 的事件循环。线程每产生一个块就通过
+            # call_soon_threadsafe 投递到队列，模型生成的同时即可向前端推送。
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            done = object()  # 生产者结束的哨兵
+            bot = await self._acquire_bot()
+
+            def _run_sync_bot() -> None:
+                responses = bot.run(messages=messages_history)
                 try:
-                    # list() 会消耗掉整个生成器，获取所有结果
-                    return list(self.bot.run(messages=messages_history))
+                    for chunk in responses:
+                        # 客户端停止或断开后不再继续拉取生成结果
+                        if cancel.is_set():
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk)
                 except Exception as e:
                     logger.error(f"Error during bot.run in thread: {e}", exc_info=True)
-                    return []
+                finally:
+                    responses.close()
+                    # 生成线程结束后才归还实例，即使消费方已提前退出
+                    loop.call_soon_threadsafe(self._bot_pool.put_nowait, bot)
+                    loop.call_soon_threadsafe(queue.put_nowait, done)
 
-            loop = asyncio.get_running_loop()
-            response_chunks_list = await loop.run_in_executor(None, _run_sync_bot)
+            loop.run_in_executor(self._executor, _run_sync_bot)
             
-            final_content = ""
-            for chunk in response_chunks_list:
-                # 检查是否需要中途停止
-                if session['stop_flag']:
-                    logger.info(f"Generation stopped for session: {session_id}")
-                    yield "[生成已停止]"
+            cursor = 0  # 已发送内容的长度
+            parts: List[str] = []
+            while True:
+                chunk = await queue.get()
+                # 生产者停止后会立即投递哨兵，两种情况都在循环外统一处理停止
+                if chunk is done or cancel.is_set():
                     break
 
                 # qwen-agent 的 run 方法返回的是一个包含历史消息的列表
@@ -186,17 +314,28 @@ class LLMService:
                         
                         current_content = last_message['content']
                         
-                        # 模型返回的是累计内容，我们只 yield 新增的部分
-                        if len(current_content) > len(final_content):
-                            new_content = current_content[len(final_content):]
-                            final_content = current_content
+                        # 模型返回的是累计内容，我们只 yield 游标之后新增的部分
+                        if len(current_content) > cursor:
+                            new_content = current_content[cursor:]
+                            cursor = len(current_content)
+                            parts.append(new_content)
                             yield new_content
-                            await asyncio.sleep(0.01) # 短暂延迟，让事件循环处理其他任务
-
-            # 如果生成未被停止，将最终的完整回复存入历史记录
-            if final_content and not session['stop_flag']:
-                self.add_message(session_id, 'assistant', final_content)
+                            await asyncio.sleep(0) # 仅让出事件循环，不引入额外延迟
+
+            # 检查是否中途停止；如果生成未被停止，将最终的完整回复存入历史记录
+            if cancel.is_set():
+                logger.info(f"Generation stopped for session: {session_id}")
+                yield "[生成已停止]"
+            else:
+                final_content = "".join(parts)
+                if final_content:
+                    self.add_message(session_id, 'assistant', final_content)
                 
+        except (asyncio.CancelledError, GeneratorExit):
+            # 消费方被取消（如客户端断开）或提前关闭生成器时，通知生成线程停止
+            cancel.set()
+            raise
+        
         except Exception as e:
             logger.error(f"Error in generate_response_stream for session {session_id}: {e}", exc_info=True)
             yield f"错误: {str(e)}"
@@ -216,7 +355,10 @@ class LLMService:
         Returns:
             List[Message]: 包含消息历史的列表，如果会话不存在则返回空列表。
         """
-        return self.active_sessions.get(session_id, {}).get('messages', [])
+        if session_id not in self.active_sessions:
+            return []
+        self._touch(session_id)
+        return self.active_sessions[session_id]['messages']
 
     def clear_session(self, session_id: str) -> bool:
         """
@@ -234,5 +376,13 @@ class LLMService:
             return True
         return False
 
+    def shutdown(self) -> None:
+        """
+        停止所有会话的生成并关闭线程池。
+        """
+        for session in self.active_sessions.values():
+            session['cancel'].set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
 # 创建一个全局单例
 llm_service = LLMService()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { io, Socket } from 'socket.io-client';
+import msgpackParser from '../msgpackParser';
 import MessageContent from './MessageContent';
 import TypingIndicator from './TypingIndicator';
 import './Chat.css';
@@ -22,8 +23,10 @@ interface ChatProps {
 const backendUrl = 'http://localhost:8080'; // 确认后端地址
 
 // 移除 transports: ['websocket']
+// 使用 MessagePack 编码，与后端 serializer='msgpack' 保持一致
 const socket: Socket = io(backendUrl, {
   autoConnect: false, 
+  parser: msgpackParser,
 });
 
 const Chat: React.FC<ChatProps> = ({ onCanvasExpand, isCanvasExpanded }) => {
@@ -66,11 +69,11 @@ const Chat: React.FC<ChatProps> = ({ onCanvasExpand, isCanvasExpanded }) => {
       setMessages(prev => [...prev, assistantMessage]);
     };
 
-    const handleResponseChunk = (data: { full_response: string }) => {
+    const handleResponseChunk = (data: { chunk: string; seq: number }) => {
       setMessages(prev => 
         prev.map(msg => 
           (msg.isStreaming && msg.type === 'assistant')
-            ? { ...msg, content: data.full_response } 
+            ? { ...msg, content: msg.content + data.chunk } 
             : msg
         )
       );
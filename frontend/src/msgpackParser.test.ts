@@ -0,0 +1,141 @@
+// msgpackParser 的往返测试：npm test（需要 Node 22.6+ 的 --experimental-strip-types）
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import msgpackParser, { encode, decode } from './msgpackParser.ts';
+
+const bytes = (...b: number[]) => new Uint8Array(b);
+
+// 解码出的 map 没有原型，比较前转回普通对象
+function plain(value: unknown): unknown {
+  if (Array.isArray(value)) return value.map(plain);
+  if (value !== null && typeof value === 'object' && Object.getPrototypeOf(value) === null) {
+    return Object.fromEntries(Object.entries(value).map(([k, v]) => [k, plain(v)]));
+  }
+  return value;
+}
+
+function roundTrip(value: unknown, tag: number) {
+  const encoded = encode(value);
+  assert.equal(encoded[0], tag, `tag for ${String(value).slice(0, 20)}`);
+  assert.deepEqual(plain(decode(encoded)), value);
+}
+
+test('nil / bool', () => {
+  roundTrip(null, 0xc0);
+  roundTrip(false, 0xc2);
+  roundTrip(true, 0xc3);
+});
+
+test('integers', () => {
+  roundTrip(0, 0x00);
+  roundTrip(0x7f, 0x7f);
+  roundTrip(0x80, 0xcc);
+  roundTrip(0xff, 0xcc);
+  roundTrip(0x100, 0xcd);
+  roundTrip(0xffff, 0xcd);
+  roundTrip(0x10000, 0xce);
+  roundTrip(0xffffffff, 0xce);
+  roundTrip(-1, 0xff);
+  roundTrip(-0x20, 0xe0);
+  roundTrip(-0x21, 0xd0);
+  roundTrip(-0x80, 0xd0);
+  roundTrip(-0x81, 0xd1);
+  roundTrip(-0x8000, 0xd1);
+  roundTrip(-0x8001, 0xd2);
+  roundTrip(-0x80000000, 0xd2);
+});
+
+test('64-bit integers and float32 (decode only)', () => {
+  assert.equal(decode(bytes(0xcf, 0, 0, 0, 1, 0, 0, 0, 2)), 0x100000002);
+  assert.equal(decode(bytes(0xd3, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xfe)), -2);
+  assert.equal(decode(bytes(0xca, 0x3f, 0xc0, 0, 0)), 1.5);
+});
+
+test('float64', () => {
+  roundTrip(1.5, 0xcb);
+  roundTrip(-0.1, 0xcb);
+  roundTrip(2 ** 40, 0xcb);
+});
+
+test('strings', () => {
+  roundTrip('', 0xa0);
+  roundTrip('等离子体', 0xa0 | 12);
+  roundTrip('x'.repeat(0x20), 0xd9);
+  roundTrip('x'.repeat(0x100), 0xda);
+  roundTrip('x'.repeat(0x10000), 0xdb);
+});
+
+test('binary', () => {
+  for (const [n, tag] of [[3, 0xc4], [0x100, 0xc5], [0x10000, 0xc6]]) {
+    const data = new Uint8Array(n).map((_, i) => i & 0xff);
+    const encoded = encode(data);
+    assert.equal(encoded[0], tag);
+    assert.deepEqual(new Uint8Array(decode(encoded) as ArrayBuffer), data);
+  }
+});
+
+test('arrays', () => {
+  roundTrip([], 0x90);
+  roundTrip([1, 'a', null, [true]], 0x94);
+  roundTrip(Array.from({ length: 0x10 }, (_, i) => i), 0xdc);
+  roundTrip(Array.from({ length: 0x10000 }, () => 0), 0xdd);
+});
+
+test('maps', () => {
+  const big = (n: number) => Object.fromEntries(Array.from({ length: n }, (_, i) => [`k${i}`, i]));
+  roundTrip({ a: 1, b: { c: 'd' } }, 0x82);
+  roundTrip(big(0x10), 0xde);
+  roundTrip(big(0x10000), 0xdf);
+  assert.deepEqual(encode({ a: 1, b: undefined }), encode({ a: 1 }));
+});
+
+test('__proto__ key does not change the prototype', () => {
+  // {"__proto__": {"polluted": true}}
+  const encoded = bytes(0x81, 0xa9, ...new TextEncoder().encode('__proto__'),
+    0x81, 0xa8, ...new TextEncoder().encode('polluted'), 0xc3);
+  const value = decode(encoded) as Record<string, unknown>;
+  assert.equal(Object.getPrototypeOf(value), null);
+  assert.deepEqual(Object.keys(value), ['__proto__']);
+  assert.equal(({} as Record<string, unknown>).polluted, undefined);
+});
+
+test('trailing bytes and unknown tags are rejected', () => {
+  assert.throws(() => decode(bytes(0xc0, 0xc0)), /trailing bytes/);
+  assert.throws(() => decode(bytes(0xc1)), /unsupported type/);
+});
+
+test('packet {type, data, nsp, id} round-trips through Encoder/Decoder', () => {
+  const packets = [
+    { type: 0, nsp: '/' },
+    { type: 2, nsp: '/', data: ['message', { message: '你好' }] },
+    { type: 2, nsp: '/chat', data: ['response_chunk', { chunk: 'x' }], id: 7 },
+    { type: 3, nsp: '/', data: [], id: 0 },
+    { type: 4, nsp: '/', data: { message: 'error' } },
+  ];
+  const decoder = new msgpackParser.Decoder();
+  const received: unknown[] = [];
+  decoder.on('decoded', (p) => received.push(p));
+  const encoder = new msgpackParser.Encoder();
+  for (const packet of packets) {
+    const [chunk] = encoder.encode(packet);
+    decoder.add(chunk);
+  }
+  assert.deepEqual(plain(received), packets);
+});
+
+test('packet with id nil from python-socketio drops the id', () => {
+  // msgpack.packb({'type': 2, 'data': ['x'], 'nsp': '/', 'id': None})
+  const encoded = encode({ type: 2, data: ['x'], nsp: '/', id: null });
+  const decoder = new msgpackParser.Decoder();
+  let packet: unknown;
+  decoder.on('decoded', (p) => { packet = p; });
+  decoder.add(encoded);
+  assert.deepEqual(plain(packet), { type: 2, data: ['x'], nsp: '/' });
+});
+
+test('invalid packets are rejected', () => {
+  const decoder = new msgpackParser.Decoder();
+  assert.throws(() => decoder.add('2["x"]'), /expected binary/);
+  assert.throws(() => decoder.add(encode({ type: 9, nsp: '/' })), /invalid packet/);
+  assert.throws(() => decoder.add(encode({ type: 2 })), /invalid packet/);
+});
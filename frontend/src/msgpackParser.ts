@@ -0,0 +1,245 @@
+// Socket.IO 的 MessagePack 编解码器，与后端 python-socketio 的 serializer='msgpack' 对应。
+// 每个 Socket.IO 数据包整体编码为一个 msgpack map：{type, data, nsp, id?}。
+
+type Packet = {
+  type: number;
+  nsp: string;
+  data?: unknown;
+  id?: number;
+};
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+class Writer {
+  private buf = new Uint8Array(256);
+  private view = new DataView(this.buf.buffer);
+  private pos = 0;
+
+  private reserve(n: number) {
+    if (this.pos + n <= this.buf.length) return;
+    let size = this.buf.length * 2;
+    while (size < this.pos + n) size *= 2;
+    const next = new Uint8Array(size);
+    next.set(this.buf);
+    this.buf = next;
+    this.view = new DataView(next.buffer);
+  }
+
+  u8(v: number) { this.reserve(1); this.view.setUint8(this.pos, v); this.pos += 1; }
+  u16(v: number) { this.reserve(2); this.view.setUint16(this.pos, v); this.pos += 2; }
+  u32(v: number) { this.reserve(4); this.view.setUint32(this.pos, v); this.pos += 4; }
+  i8(v: number) { this.reserve(1); this.view.setInt8(this.pos, v); this.pos += 1; }
+  i16(v: number) { this.reserve(2); this.view.setInt16(this.pos, v); this.pos += 2; }
+  i32(v: number) { this.reserve(4); this.view.setInt32(this.pos, v); this.pos += 4; }
+  f64(v: number) { this.reserve(8); this.view.setFloat64(this.pos, v); this.pos += 8; }
+  bytes(b: Uint8Array) { this.reserve(b.length); this.buf.set(b, this.pos); this.pos += b.length; }
+
+  result(): Uint8Array {
+    return this.buf.slice(0, this.pos);
+  }
+}
+
+function encodeValue(w: Writer, value: unknown): void {
+  if (value === null || value === undefined) {
+    w.u8(0xc0);
+  } else if (typeof value === 'boolean') {
+    w.u8(value ? 0xc3 : 0xc2);
+  } else if (typeof value === 'number') {
+    if (Number.isInteger(value) && value >= -0x80000000 && value <= 0xffffffff) {
+      if (value >= 0) {
+        if (value < 0x80) w.u8(value);
+        else if (value < 0x100) { w.u8(0xcc); w.u8(value); }
+        else if (value < 0x10000) { w.u8(0xcd); w.u16(value); }
+        else { w.u8(0xce); w.u32(value); }
+      } else {
+        if (value >= -0x20) w.i8(value);
+        else if (value >= -0x80) { w.u8(0xd0); w.i8(value); }
+        else if (value >= -0x8000) { w.u8(0xd1); w.i16(value); }
+        else { w.u8(0xd2); w.i32(value); }
+      }
+    } else {
+      w.u8(0xcb);
+      w.f64(value);
+    }
+  } else if (typeof value === 'string') {
+    const b = textEncoder.encode(value);
+    if (b.length < 0x20) w.u8(0xa0 | b.length);
+    else if (b.length < 0x100) { w.u8(0xd9); w.u8(b.length); }
+    else if (b.length < 0x10000) { w.u8(0xda); w.u16(b.length); }
+    else { w.u8(0xdb); w.u32(b.length); }
+    w.bytes(b);
+  } else if (value instanceof ArrayBuffer || ArrayBuffer.isView(value)) {
+    const b = value instanceof ArrayBuffer
+      ? new Uint8Array(value)
+      : new Uint8Array(value.buffer, value.byteOffset, value.byteLength);
+    if (b.length < 0x100) { w.u8(0xc4); w.u8(b.length); }
+    else if (b.length < 0x10000) { w.u8(0xc5); w.u16(b.length); }
+    else { w.u8(0xc6); w.u32(b.length); }
+    w.bytes(b);
+  } else if (Array.isArray(value)) {
+    if (value.length < 0x10) w.u8(0x90 | value.length);
+    else if (value.length < 0x10000) { w.u8(0xdc); w.u16(value.length); }
+    else { w.u8(0xdd); w.u32(value.length); }
+    for (const item of value) encodeValue(w, item);
+  } else if (typeof value === 'object') {
+    const entries = Object.entries(value as Record<string, unknown>).filter(([, v]) => v !== undefined);
+    if (entries.length < 0x10) w.u8(0x80 | entries.length);
+    else if (entries.length < 0x10000) { w.u8(0xde); w.u16(entries.length); }
+    else { w.u8(0xdf); w.u32(entries.length); }
+    for (const [k, v] of entries) {
+      encodeValue(w, k);
+      encodeValue(w, v);
+    }
+  } else {
+    throw new Error(`msgpack: cannot encode ${typeof value}`);
+  }
+}
+
+export function encode(value: unknown): Uint8Array {
+  const w = new Writer();
+  encodeValue(w, value);
+  return w.result();
+}
+
+class Reader {
+  private bytes: Uint8Array;
+  private view: DataView;
+  private pos = 0;
+
+  constructor(bytes: Uint8Array) {
+    this.bytes = bytes;
+    this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  }
+
+  value(): unknown {
+    const t = this.u8();
+    if (t < 0x80) return t;
+    if (t < 0x90) return this.map(t & 0x0f);
+    if (t < 0xa0) return this.array(t & 0x0f);
+    if (t < 0xc0) return this.str(t & 0x1f);
+    if (t >= 0xe0) return t - 0x100;
+    switch (t) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return this.bin(this.u8());
+      case 0xc5: return this.bin(this.u16());
+      case 0xc6: return this.bin(this.u32());
+      case 0xca: { const v = this.view.getFloat32(this.pos); this.pos += 4; return v; }
+      case 0xcb: { const v = this.view.getFloat64(this.pos); this.pos += 8; return v; }
+      case 0xcc: return this.u8();
+      case 0xcd: return this.u16();
+      case 0xce: return this.u32();
+      case 0xcf: { const hi = this.u32(); return hi * 0x100000000 + this.u32(); }
+      case 0xd0: { const v = this.view.getInt8(this.pos); this.pos += 1; return v; }
+      case 0xd1: { const v = this.view.getInt16(this.pos); this.pos += 2; return v; }
+      case 0xd2: { const v = this.view.getInt32(this.pos); this.pos += 4; return v; }
+      case 0xd3: { const hi = this.view.getInt32(this.pos); this.pos += 4; return hi * 0x100000000 + this.u32(); }
+      case 0xd9: return this.str(this.u8());
+      case 0xda: return this.str(this.u16());
+      case 0xdb: return this.str(this.u32());
+      case 0xdc: return this.array(this.u16());
+      case 0xdd: return this.array(this.u32());
+      case 0xde: return this.map(this.u16());
+      case 0xdf: return this.map(this.u32());
+      default: throw new Error(`msgpack: unsupported type 0x${t.toString(16)}`);
+    }
+  }
+
+  done(): boolean {
+    return this.pos === this.bytes.length;
+  }
+
+  private u8() { const v = this.view.getUint8(this.pos); this.pos += 1; return v; }
+  private u16() { const v = this.view.getUint16(this.pos); this.pos += 2; return v; }
+  private u32() { const v = this.view.getUint32(this.pos); this.pos += 4; return v; }
+
+  private str(n: number): string {
+    const s = textDecoder.decode(this.bytes.subarray(this.pos, this.pos + n));
+    this.pos += n;
+    return s;
+  }
+
+  private bin(n: number): ArrayBuffer {
+    const b = this.bytes.slice(this.pos, this.pos + n);
+    this.pos += n;
+    return b.buffer;
+  }
+
+  private array(n: number): unknown[] {
+    const out = new Array(n);
+    for (let i = 0; i < n; i++) out[i] = this.value();
+    return out;
+  }
+
+  // 无原型对象，服务端发来的 __proto__ 之类的键只会成为普通属性
+  private map(n: number): Record<string, unknown> {
+    const out: Record<string, unknown> = Object.create(null);
+    for (let i = 0; i < n; i++) {
+      const key = this.value();
+      out[String(key)] = this.value();
+    }
+    return out;
+  }
+}
+
+export function decode(data: ArrayBuffer | ArrayBufferView): unknown {
+  const bytes = data instanceof ArrayBuffer
+    ? new Uint8Array(data)
+    : new Uint8Array(data.buffer, data.byteOffset, data.byteLength);
+  const reader = new Reader(bytes);
+  const value = reader.value();
+  if (!reader.done()) throw new Error('msgpack: trailing bytes');
+  return value;
+}
+
+function isPacket(p: unknown): p is Packet {
+  if (typeof p !== 'object' || p === null) return false;
+  const packet = p as Packet;
+  return Number.isInteger(packet.type) && packet.type >= 0 && packet.type <= 6
+    && typeof packet.nsp === 'string'
+    && (packet.id === undefined || packet.id === null || Number.isInteger(packet.id));
+}
+
+class Encoder {
+  encode(packet: Packet): Uint8Array[] {
+    return [encode(packet)];
+  }
+}
+
+type Listener = (packet: Packet) => void;
+
+class Decoder {
+  private listeners: Listener[] = [];
+
+  on(event: string, fn: Listener) {
+    if (event === 'decoded') this.listeners.push(fn);
+    return this;
+  }
+
+  off(event?: string, fn?: Listener) {
+    if (event === undefined || fn === undefined) this.listeners = [];
+    else if (event === 'decoded') this.listeners = this.listeners.filter(l => l !== fn);
+    return this;
+  }
+
+  add(data: unknown) {
+    if (!(data instanceof ArrayBuffer || ArrayBuffer.isView(data))) {
+      throw new Error('msgpack parser: expected binary data');
+    }
+    const packet = decode(data);
+    if (!isPacket(packet)) throw new Error('msgpack parser: invalid packet');
+    if (packet.id === null) delete packet.id;
+    for (const fn of this.listeners) fn(packet);
+  }
+
+  destroy() {
+    this.listeners = [];
+  }
+}
+
+// socket.io-client 的 parser 选项
+const msgpackParser = { protocol: 5, Encoder, Decoder };
+
+export default msgpackParser;